@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for browser action result records.
+
+Compares the slotted `BrowserActionResult` with the previous pydantic model: construction
+overhead per action, memory held per record, and the pickled size of a success record with data
+and of a failure record. Then measures what a step adds to the checkpoint: the channels it writes
+(execution_state, browser_state, its tool message) serialized with the checkpointer's own serializer.
+
+Run from the repository root: python -m benchmarks.action_result
+"""
+import pickle
+import timeit
+import tracemalloc
+from datetime import datetime
+from typing import Optional, Any
+from pydantic import BaseModel, Field
+from langchain_core.messages import ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from src.agent.schema import update_execution_state, update_browser_state
+from src.browser.schema import BrowserActionResult
+
+N = 100_000
+
+
+class LegacyBrowserActionResult(BaseModel):
+    success: bool
+    message: str
+    action_type: Optional[str] = None
+    data: Optional[dict[str, Any]] = None
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+    @classmethod
+    def create_success(cls, action_type: str, message: str, data: dict = None):
+        return cls(success=True, action_type=action_type, message=message, data=data)
+
+    @classmethod
+    def create_failure(cls, action_type: str, message: str, error: str = None):
+        return cls(success=False, action_type=action_type, message=message)
+
+
+def per_action_us(factory) -> float:
+    seconds = min(timeit.repeat(lambda: factory.create_success("click", "Successfully clicked at (10,20)"), number=N, repeat=5))
+    return seconds / N * 1e6
+
+
+def bytes_per_record(factory) -> float:
+    tracemalloc.start()
+    records = [factory.create_success("click", f"Successfully clicked at ({i},20)") for i in range(N)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current / N
+
+
+def serialized_bytes(factory) -> tuple[int, int]:
+    """Pickled size of the records themselves, a success carrying data and a failure."""
+    success = factory.create_success("scroll", "Scrolled down 500px", data={"scroll_y": 1500, "found": True})
+    failure = factory.create_failure("click", "Error clicking at coordinates (10,20): Timeout 5000ms exceeded")
+    return len(pickle.dumps(success)), len(pickle.dumps(failure))
+
+
+def checkpoint_step_bytes(step: int) -> dict[str, int]:
+    """
+    Serialized bytes of the channels written by step `step` of a click-through session. The saver stores
+    the whole reduced value of each changed channel, so the state channels grow with the history.
+    """
+    serde = InMemorySaver().serde
+    execution_state = {"task": "Find the cheapest flight", "history": [], "errors": [], "consecutive_failures": 0, "status": "pending", "steps": []}
+    browser_state = {"url": "https://example.com/", "screenshots": [0]}
+    for index in range(1, step + 1):
+        result = BrowserActionResult.create_success("click", f"Successfully clicked at ({index},20)")
+        url = f"https://example.com/results?page={index}"
+        execution_state = update_execution_state(execution_state, {"history": [f"Clicked on 'Next page' ({index},20)"], "failed": False})
+        execution_state = update_execution_state(execution_state, {"steps": [{
+            "action": f'click({{"description": "Next page", "label": "Next", "x": {index}, "y": 20}})',
+            "url": url,
+            "screen": f"{index:016x}",
+            "dom_changed": True,
+        }]})
+        browser_state = update_browser_state(browser_state, {
+            "url": url,
+            "dom_structure": f'- a "Page {index - 1}"\n+ a "Page {index}"',
+            "screenshots": [index],
+            "geometry": {"viewport_width": 1280, "viewport_height": 800, "device_scale_factor": 1.0, "image_width": 1280, "image_height": 800},
+            "observation": "image",
+            "steps_without_image": 0,
+        })
+    written = {
+        "execution_state": execution_state,
+        "browser_state": browser_state,
+        "messages": [ToolMessage(content=result.message, tool_call_id=f"call_{step}")],
+    }
+    return {channel: len(serde.dumps_typed(value)[1]) for channel, value in written.items()}
+
+
+def main():
+    rows = [
+        ("pydantic (before)", LegacyBrowserActionResult),
+        ("slots dataclass", BrowserActionResult),
+    ]
+    print(f"{'record':<20}{'us/action':>12}{'bytes/record':>15}{'pickled ok':>12}{'pickled err':>13}")
+    for name, factory in rows:
+        success_bytes, failure_bytes = serialized_bytes(factory)
+        print(f"{name:<20}{per_action_us(factory):>12.2f}{bytes_per_record(factory):>15.0f}{success_bytes:>12}{failure_bytes:>13}")
+
+    print(f"\n{'checkpointed step':<20}{'execution':>12}{'browser':>15}{'messages':>12}{'total':>13}")
+    for step in (1, 10, 25, 50):
+        written = checkpoint_step_bytes(step)
+        print(f"{f'step {step}':<20}{written['execution_state']:>12}{written['browser_state']:>15}{written['messages']:>12}{sum(written.values()):>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Load test for concurrent agent sessions.
+
+Ramps up the number of concurrent `agent.astream` sessions against the local fixture site in
+benchmarks/fixtures, with the offline model standing in for the supervisor. For every level it records
+throughput, p50/p95/p99 step latency, model queueing, event-loop lag, process RSS and Chromium
+process count, and reports the level where scaling breaks down and the likely bottleneck.
+
+Run from the repository root: python -m benchmarks.load_test --levels 1,2,4,8,16
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from src.agent import agent as agent_module
+from src.agent.grounding import grounding
+from src.agent.offline import OfflineModel, OfflineScript
+from src.agent.agent import agent, build_initial_state
+from src.browser import initialize_browser, close_browser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+# Tool calls every session walks through, against the fixture site
+SCRIPT_STEPS = [
+    {"name": "navigate_to_url", "args": {"url": "{base_url}/list.html"}},
+    {"name": "scroll", "args": {"direction": "down", "until_text": "Item 150"}},
+    {"name": "navigate_to_url", "args": {"url": "{base_url}/form.html"}},
+    {"name": "press_keys", "args": {"keys": ["Tab"]}},
+    {"name": "type", "args": {"text": "load test", "label": "name"}},
+    {"name": "go_back", "args": {}},
+    {"name": "exit", "args": {"reason": "Scripted session finished", "success": True}},
+]
+
+
+def _process_stats() -> dict:
+    """RSS of this process and count/RSS of Chromium processes, via psutil if installed, else /proc."""
+    try:
+        import psutil
+        chromium = [p for p in psutil.process_iter(["name", "memory_info"]) if "chrom" in (p.info["name"] or "").lower()]
+        return {
+            "rss_mb": psutil.Process().memory_info().rss / 2**20,
+            "chromium_processes": len(chromium),
+            "chromium_rss_mb": sum(p.info["memory_info"].rss for p in chromium if p.info["memory_info"]) / 2**20,
+        }
+    except ImportError:
+        pass
+
+    page_mb = os.sysconf("SC_PAGE_SIZE") / 2**20
+    def rss(pid):
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * page_mb
+
+    chromium_count, chromium_rss = 0, 0.0
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/comm") as f:
+                if "chrom" not in f.read().lower():
+                    continue
+            chromium_count += 1
+            chromium_rss += rss(pid)
+        except OSError:
+            continue
+    return {"rss_mb": rss("self"), "chromium_processes": chromium_count, "chromium_rss_mb": chromium_rss}
+
+
+async def _sample_loop_lag(samples: list, interval: float = 0.05):
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        samples.append(time.monotonic() - start - interval)
+
+
+async def _sample_resources(samples: list, interval: float = 1.0):
+    while True:
+        samples.append(_process_stats())
+        await asyncio.sleep(interval)
+
+
+async def _session(browser, index: int, step_latencies: list):
+    session_id = f"load-{index}-{uuid.uuid4().hex[:8]}"
+    async with browser.lease_page():
+        state = await build_initial_state(browser, task=f"Load test session {session_id}", user_id="load-test", session_id=session_id)
+        config = {"recursion_limit": 50, "configurable": {"thread_id": session_id}}
+        last = time.monotonic()
+        async for _ in agent.astream(state, config=config, stream_mode="updates"):
+            now = time.monotonic()
+            step_latencies.append(now - last)
+            last = now
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def run_level(browser, model: OfflineModel, level: int) -> dict:
+    step_latencies, lag_samples, resource_samples = [], [], []
+    model.queue_waits.clear()
+    samplers = [
+        asyncio.create_task(_sample_loop_lag(lag_samples)),
+        asyncio.create_task(_sample_resources(resource_samples)),
+    ]
+    start = time.monotonic()
+    results = await asyncio.gather(*(_session(browser, i, step_latencies) for i in range(level)), return_exceptions=True)
+    elapsed = time.monotonic() - start
+    for sampler in samplers:
+        sampler.cancel()
+
+    return {
+        "sessions": level,
+        "failed_sessions": sum(isinstance(result, Exception) for result in results),
+        "seconds": elapsed,
+        "steps": len(step_latencies),
+        "steps_per_second": len(step_latencies) / elapsed,
+        "step_p50_ms": _percentile(step_latencies, 50) * 1000,
+        "step_p95_ms": _percentile(step_latencies, 95) * 1000,
+        "step_p99_ms": _percentile(step_latencies, 99) * 1000,
+        "model_queue_p95_ms": _percentile(model.queue_waits, 95) * 1000,
+        "loop_lag_p99_ms": _percentile(lag_samples, 99) * 1000,
+        "loop_lag_max_ms": max(lag_samples, default=0) * 1000,
+        "rss_peak_mb": max((s["rss_mb"] for s in resource_samples), default=0),
+        "chromium_processes_peak": max((s["chromium_processes"] for s in resource_samples), default=0),
+        "chromium_rss_peak_mb": max((s["chromium_rss_mb"] for s in resource_samples), default=0),
+    }
+
+
+def diagnose(levels: list[dict], model: OfflineModel, efficiency_floor: float = 0.7) -> str:
+    """Find the first level where throughput stops scaling with sessions and name the likely bottleneck."""
+    base = levels[0]["steps_per_second"] / levels[0]["sessions"]
+    for level in levels[1:]:
+        efficiency = level["steps_per_second"] / (base * level["sessions"])
+        if efficiency >= efficiency_floor:
+            continue
+        if level["loop_lag_p99_ms"] > 100:
+            cause = f"event loop (p99 lag {level['loop_lag_p99_ms']:.0f}ms)"
+        elif level["model_queue_p95_ms"] > model.script.supervisor_latency.mean * 1000:
+            cause = f"model-call queueing (p95 wait {level['model_queue_p95_ms']:.0f}ms)"
+        else:
+            cause = f"Chromium ({level['chromium_processes_peak']} processes, {level['chromium_rss_peak_mb']:.0f}MB RSS)"
+        return f"Scaling breaks down at {level['sessions']} sessions ({efficiency:.0%} efficiency), likely bottleneck: {cause}"
+    return f"Throughput scaled to {levels[-1]['sessions']} sessions (>= {efficiency_floor:.0%} efficiency at every level)"
+
+
+def format_report(levels: list[dict], diagnosis: str) -> str:
+    columns = [
+        ("sessions", "N", "{:>4}"), ("steps_per_second", "steps/s", "{:>8.2f}"),
+        ("step_p50_ms", "p50 ms", "{:>8.0f}"), ("step_p95_ms", "p95 ms", "{:>8.0f}"), ("step_p99_ms", "p99 ms", "{:>8.0f}"),
+        ("model_queue_p95_ms", "queue ms", "{:>9.0f}"), ("loop_lag_p99_ms", "lag ms", "{:>7.0f}"),
+        ("rss_peak_mb", "RSS MB", "{:>7.0f}"), ("chromium_processes_peak", "chrome", "{:>7}"),
+        ("chromium_rss_peak_mb", "chr MB", "{:>7.0f}"), ("failed_sessions", "failed", "{:>7}"),
+    ]
+    header = "".join(f"{title:>{len(fmt.format(0))}}" for _, title, fmt in columns)
+    rows = ["".join(fmt.format(level[key]) for key, _, fmt in columns) for level in levels]
+    return "\n".join([header, *rows, "", diagnosis])
+
+
+def serve_fixtures() -> ThreadingHTTPServer:
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=FIXTURES)
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def main(levels: list[int], model_latency: float, max_inflight: int, output: str, profile: str):
+    server = serve_fixtures()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    script = OfflineScript(
+        steps=SCRIPT_STEPS,
+        latency={"supervisor": {"mean": model_latency, "jitter": 0.3}},
+        variables={"base_url": base_url},
+    )
+    model = OfflineModel(script, max_inflight=max_inflight)
+    agent_module.llm = model
+    grounding.backend = model
+
+    browser = await initialize_browser(profile=profile, max_parallel_tabs=max(levels), max_tabs=max(levels) + 1)
+    try:
+        results = []
+        for level in levels:
+            results.append(await run_level(browser, model, level))
+            print(f"level {level}: {results[-1]['steps_per_second']:.2f} steps/s, p95 {results[-1]['step_p95_ms']:.0f}ms")
+    finally:
+        await close_browser()
+        server.shutdown()
+
+    report = format_report(results, diagnose(results, model))
+    print(report)
+    with open(output, "w") as f:
+        json.dump({"levels": results, "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test concurrent agent sessions")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrent session counts to ramp through")
+    parser.add_argument("--model-latency", type=float, default=0.8, help="Mean scripted model latency in seconds")
+    parser.add_argument("--max-inflight", type=int, default=8, help="Concurrent model calls before requests queue")
+    parser.add_argument("--profile", default="headless-throughput", help="Browser launch profile")
+    parser.add_argument("--output", default="load_test_report.json")
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.levels.split(",")], args.model_latency, args.max_inflight, args.output, args.profile))
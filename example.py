@@ -10,41 +10,32 @@ import sys
 import os
 import base64
 from typing import Dict, Any
-from src.browser import initialize_browser
+from src.browser import initialize_browser, StorageStateCache
 from langgraph.errors import NodeInterrupt
-from src.agent.agent import agent
+from src.agent.agent import agent, screenshot_archive, build_initial_state
+from src.agent.frames import frame_store
 from langgraph.types import Command
+from src.utils.loop_monitor import start_loop_monitor, stop_loop_monitor
+from src.utils.accounting import usage_summary, export_usage
 
-async def main(task, use_debug_chrome):
+async def main(task, use_debug_chrome, warm_sites=None):
     
-    browser = await initialize_browser(use_debug_chrome=use_debug_chrome)
+    # Reports callbacks that block the event loop when LOOP_MONITOR=1
+    start_loop_monitor()
+    
+    # Sandboxed sessions start from cached logins instead of the single persistent profile
+    browser = await initialize_browser(
+        use_debug_chrome=use_debug_chrome,
+        storage_cache=None if use_debug_chrome else StorageStateCache(),
+        warm_sites=warm_sites,
+    )
     
     try: 
         await browser.navigate("https://www.bing.com")
         print("Browser initialized and navigated to Bing.")
-        screenshot = await browser.screenshot_bytes()
-        screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-        
-        initial_state = {
-            "user_id": "user_123",
-            "session_id": str(uuid.uuid4()),
-            "messages": [{"role": "user", "content": task}],
-            "execution_state": {
-                "task": task,
-                "history": [],
-                "errors": [],
-                "consecutive_failures": 0,
-                "status": "pending",
-            },
-            "browser_state": {
-                "page_title": "Bing",
-                "url": "https://www.bing.com",
-                "dom_structure": "",
-                "viewport_width": browser.viewport_width,
-                "viewport_height": browser.viewport_height,
-                "screenshots": [screenshot_base64]
-            }
-        }
+        session_id = str(uuid.uuid4())
+        # Observes the current page, recording its real viewport with the first frame
+        initial_state = await build_initial_state(browser, task=task, user_id="user_123", session_id=session_id)
         
         config = {
             "recursion_limit": 50,
@@ -86,13 +77,30 @@ async def main(task, use_debug_chrome):
                         break
                     else : print(chunk["messages"][-1].pretty_print())
 
+        final_state = (await agent.aget_state(config)).values
+        print(f"Usage: {usage_summary(final_state.get('usage'))}")
+        export_usage(final_state.get('usage'), session_id, task=task, url=browser.page.url)
+        
+        breaker = final_state['execution_state'].get('breaker')
+        if breaker:
+            print(f"Circuit breaker: {len(breaker['trips'])} trips, {breaker['steps_saved']} steps saved")
+
+        if browser.storage_cache:
+            await browser.save_storage_state()
+
+        await screenshot_archive.finalize(session_id)
+        frame_store.close(session_id)
+
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        await screenshot_archive.close()
         await browser.close()
+        stop_loop_monitor()
 
 
 
 USE_DEBUG_CHROME = True
+WARM_SITES = ["web.whatsapp.com"]
 TASK = "go to the url https://web.whatsapp.com and send message to 'abhishek' with your introduction as a browser automation. You have to ask abhishek if he is free to go on 'nadhi' today, ask reason if says no"
-asyncio.run(main(task=TASK, use_debug_chrome=USE_DEBUG_CHROME))
\ No newline at end of file
+asyncio.run(main(task=TASK, use_debug_chrome=USE_DEBUG_CHROME, warm_sites=WARM_SITES))
\ No newline at end of file
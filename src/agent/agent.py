@@ -10,36 +10,128 @@ import os
 import base64
 import asyncio
 import inspect
+import json
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
-from .utils import get_model, SYSTEM_MESSAGE
+from .utils import get_model, get_observation_mode, get_supervisor_streaming, get_adaptive_observation, SYSTEM_MESSAGE
 from .tools import tools
+from .archive import ScreenshotArchive
+from .frames import frame_store
+from .recording import invoke_model, current_recording
+from .streaming import stream_with_early_dispatch, dispatch_scope, claim_dispatched, await_dispatched, release_dispatched
+from .progress import BreakerConfig, detect_loop, step_record, trip
+from .observation import ObservationPolicy
 from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.errors import NodeInterrupt
+from langgraph.errors import NodeInterrupt, GraphInterrupt
 from .schema import *
 from ..browser import get_browser
+from ..browser.marks import format_element_table
+from ..utils.loop_monitor import monitored
+from ..utils.accounting import accounted, count, record_model_call
 
 llm = get_model()
+escalated_llm = None
+breaker_config = BreakerConfig.from_env()
+observation_policy = ObservationPolicy()
 
 
-browser_action_router = ToolNode(
+def supervisor_model(strategy: str):
+    """Supervisor model for the circuit breaker strategy, the escalation model is created on first use."""
+    global escalated_llm
+    # The breaker only escalates to this strategy with ESCALATION_MODEL_NAME set, see available_strategies
+    if strategy != "escalated_model" or not os.getenv("ESCALATION_MODEL_NAME"):
+        return llm
+    if escalated_llm is None:
+        escalated_llm = get_model(os.getenv("ESCALATION_MODEL_NAME"))
+    return escalated_llm
+
+
+tool_node = ToolNode(
     tools,
     name="browser_action_router"
 )
+tools_by_name = {t.name: t for t in tools}
+
+
+@monitored("browser_action_router")
+@accounted
+async def browser_action_router(state: AgentState, config):
+    """Runs the supervisor's tool calls, awaiting the ones it already dispatched while streaming."""
+    message = state['messages'][-1]
+    scope = dispatch_scope(config)
+    dispatched = claim_dispatched(scope, message.tool_calls)
+    if not dispatched:
+        return await tool_node.ainvoke(state, config)
+    
+    # Awaited before the remaining calls, which may interrupt: the results stay registered, and when
+    # the node runs again on resume it reuses them instead of repeating the actions
+    updates = await await_dispatched(scope, dispatched)
+    remaining = [call for call in message.tool_calls if call["id"] not in dispatched]
+    if remaining:
+        # Calls that aren't dispatched early (interrupts, exit, ...) go through the ToolNode as usual
+        partial = message.model_copy(update={"tool_calls": remaining})
+        try:
+            output = await tool_node.ainvoke({**state, "messages": [*state['messages'][:-1], partial]}, config)
+        except GraphInterrupt:
+            raise
+        except BaseException:
+            release_dispatched(scope)
+            raise
+        for item in output if isinstance(output, list) else [output]:
+            updates.append(item if isinstance(item, Command) else Command(update=item))
+    release_dispatched(scope, dispatched)
+    return updates
 
 
-x=0
-async def browser_supervisor(state: AgentState):
+screenshot_archive = ScreenshotArchive(compress=os.getenv("SCREENSHOT_ARCHIVE_COMPRESS") or None)
+
+@monitored("browser_supervisor")
+@accounted
+async def browser_supervisor(state: AgentState, config):
     """Supervisor agent that manages browser actions based on user goals."""
     
-    if state['execution_state']['status'] == "failed":
+    reason = detect_loop(state['execution_state'], breaker_config)
+    if reason and state['execution_state']['status'] not in ("completed", "failed"):
+        update = trip(state['execution_state'], reason, config.get("recursion_limit", 25))
+        if update.get("status") == "failed":
+            return Command(goto=END, update={
+                "execution_state": update,
+                "messages": [AIMessage(content=f"Stopped early: {reason}")],
+            })
+        # The next strategy starts on this step, with the trip in the execution state
+        state = {**state, "execution_state": {**state['execution_state'], **update, "errors": state['execution_state'].get('errors', []) + update["errors"]}}
+    else:
+        update = None
+    
+    page_update = None
+    if update and update.get("strategy") == "dom":
+        # The supervisor is told to use the element table on this step, so it needs one now
+        browser = await get_browser()
+        marked = await browser.screenshot_with_marks()
+        if marked.success:
+            page_update = {
+                "screenshots": [frame_store.append(state['session_id'], marked.data["screenshot"])],
+                "geometry": marked.data["geometry"].to_dict(),
+                "elements": marked.data["elements"],
+                "observation": "image",
+                "steps_without_image": 0,
+            }
+            state = {**state, "browser_state": update_browser_state(state['browser_state'], page_update)}
+    
+    # Set by the exit tool or a stopping circuit breaker
+    if state['execution_state']['status'] in ("completed", "failed"):
         from rich.markdown import Markdown
         from rich.console import Console
         console = Console()
         console.print(Markdown(f"{state['messages']}"))
         return Command(goto=END)
     
+    # Text-only steps reuse the last screenshot the supervisor saw instead of sending a new one
+    with_image = state['browser_state'].get('observation', "image") != "text"
+    screenshot = state['browser_state']['screenshots'][-1]
+    # Encoded only here, at the provider boundary
+    image_url = frame_store.data_url(state['session_id'], screenshot) if with_image else None
     content = [
         {
             "type": "text", 
@@ -47,7 +139,10 @@ async def browser_supervisor(state: AgentState):
         },
         {
             "type": "image_url", 
-            "image_url": {"url": f"data:image/png;base64,{state['browser_state']['screenshots'][-1]}"}
+            "image_url": {"url": image_url}
+        } if with_image else {
+            "type": "text",
+            "text": "No new screenshot for this step: the page stayed in place, its changes are in the page text below."
         },
         {
             "type": "text",
@@ -57,40 +152,218 @@ async def browser_supervisor(state: AgentState):
             "type": "text",
             "text": f"Execution History: {state['execution_state']['history'][-5:] if state['execution_state']['history'] else 'No actions taken yet.'}"
         },
+    ]
+    
+    if update:
+        content.append({
+            "type": "text",
+            "text": update["errors"][-1]
+        })
+    
+    if state['browser_state'].get('dom_structure'):
+        content.append({
+            "type": "text",
+            "text": f"Page text (full outline after navigation, otherwise +/- changes since the last step):\n{state['browser_state']['dom_structure']}"
+        })
+    
+    if state['browser_state'].get('elements'):
+        content.append({
+            "type": "text",
+            "text": f"Marked interactive elements (use click_element with the number):\n{format_element_table(state['browser_state']['elements'])}"
+        })
+    
+    content += [
         {
             "type": "text",
-            "text": f"Analyze the screenshot and decide the next best action to take based on the user's goal. Also analyze the last tool call status."
+            "text": f"Analyze the {'screenshot' if with_image else 'page changes'} and decide the next best action to take based on the user's goal. Also analyze the last tool call status."
         }
     ]
     
     
     
-    folder = "screenshots"
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-        
-    global x
-    filename = f"screenshot_{x}.png"
-    x += 1
-    filepath = os.path.join(folder, filename)
-
-    image_data = base64.b64decode(state['browser_state']['screenshots'][-1])
-    with open(filepath, "wb") as f:
-        f.write(image_data)
+    # Written by the archive's background worker, not on this step
+    if with_image:
+        screenshot_archive.submit(state['session_id'], frame_store.view(state['session_id'], screenshot), frame_store.image_type(state['session_id'], screenshot))
         
-        
-    response = await llm.bind_tools(tools).ainvoke([
+    model = supervisor_model(state['execution_state'].get('strategy', "default"))
+    messages = [
         SystemMessage(content=SYSTEM_MESSAGE),
         HumanMessage(content=content)
-    ])
+    ]
+    # Recordings store whole responses, so recorded and replayed sessions don't stream
+    if get_supervisor_streaming() and current_recording.get() is None:
+        scope = dispatch_scope(config)
+        try:
+            response = await stream_with_early_dispatch(model.bind_tools(tools), messages, state, tools_by_name, scope)
+        except BaseException:
+            # Nobody routes the calls of a failed or cancelled step
+            release_dispatched(scope)
+            raise
+    else:
+        # Recordings reference the screenshot in the frame store instead of keeping its base64
+        frames = {image_url: {"session_id": state['session_id'], "index": screenshot}} if with_image else None
+        response = await invoke_model(model.bind_tools(tools), messages, node="browser_supervisor", frames=frames)
+    record_model_call("browser_supervisor", response, image_bytes=len(frame_store.view(state['session_id'], screenshot)) if with_image else 0)
+    if update:
+        return {"messages": [response], "execution_state": update, **({"browser_state": page_update} if page_update else {})}
     return {"messages": [response]}
 
 # Additional state updater node
+def observation_mode(state: AgentState) -> str:
+    # The circuit breaker switches sessions stuck on screenshot grounding to the marked element table
+    if state['execution_state'].get('strategy', "default") != "default":
+        return "marks"
+    return get_observation_mode()
+
+
+@monitored("state_updater")
+@accounted
 async def state_updater(state: AgentState):
     browser = await get_browser()
-    screenshot = await browser.screenshot_bytes()
-    screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-    state['browser_state']['screenshots'].append(screenshot_base64)
+    update = {}
+    dom_result = await browser.get_dom_structure()
+    update['dom_structure'] = dom_result.data["dom"] if dom_result.success else ""
+    update['url'] = browser.page.url
+    
+    # The supervisor message that led here, whose tool results follow it
+    action = next((message for message in reversed(state['messages']) if isinstance(message, AIMessage)), None)
+    if get_adaptive_observation():
+        observation = observation_policy.classify(
+            previous_url=state['browser_state'].get('url'),
+            url=update['url'],
+            dom=update['dom_structure'],
+            dom_full=not dom_result.success or dom_result.data["full"],
+            focused=await browser.focused_element(),
+            tool_names=[call["name"] for call in getattr(action, "tool_calls", [])],
+            failed=state['execution_state'].get('consecutive_failures', 0) > 0,
+            steps_without_image=state['browser_state'].get('steps_without_image', 0),
+        )
+    else:
+        observation = "image"
+    # Marks are only drawn on full screenshots, and the element table must match them
+    if observation == "thumbnail" and observation_mode(state) == "marks":
+        observation = "image"
+    count("observations", per=observation)
+    
+    result = None
+    if observation == "image" and observation_mode(state) == "marks":
+        result = await browser.screenshot_with_marks()
+        update['elements'] = result.data["elements"] if result.success else []
+    elif observation == "thumbnail":
+        result = await browser.screenshot_thumbnail()
+    if observation != "text" and (result is None or not result.success):
+        observation = "image"
+        result = await browser.screenshot_frame()
+    
+    update['observation'] = observation
+    if observation == "text":
+        update['steps_without_image'] = state['browser_state'].get('steps_without_image', 0) + 1
+    else:
+        update['screenshots'] = [frame_store.append(state['session_id'], result.data["screenshot"], "jpeg" if observation == "thumbnail" else "png")]
+        update['geometry'] = result.data["geometry"].to_dict()
+        update['steps_without_image'] = state['browser_state'].get('steps_without_image', 0) + 1 if observation == "thumbnail" else 0
+    
+    # Text-only steps are compared by their DOM changes
+    screen = frame_store.view(state['session_id'], update['screenshots'][-1]) if observation != "text" else update['dom_structure']
+    step = step_record(action, update['url'], screen, update['dom_structure'])
+    return {"browser_state": update, "execution_state": {"steps": [step]}}
+
+
+async def build_initial_state(browser, task: str, user_id: str, session_id: str, parent_task: Optional[str] = None) -> AgentState:
+    """Initial graph state for a task, observing the browser's current page."""
+    frame = await browser.screenshot_frame()
+    dom_result = await browser.get_dom_structure()
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "messages": [{"role": "user", "content": task}],
+        "execution_state": {
+            "task": task,
+            "history": [],
+            "errors": [],
+            "consecutive_failures": 0,
+            "status": "pending",
+            "parent_task": parent_task,
+        },
+        "browser_state": {
+            "page_title": await browser.page.title(),
+            "url": browser.page.url,
+            "dom_structure": dom_result.data["dom"] if dom_result.success else "",
+            "viewport_width": browser.viewport_width,
+            "viewport_height": browser.viewport_height,
+            "screenshots": [frame_store.append(session_id, frame.data["screenshot"])],
+            "geometry": frame.data["geometry"].to_dict(),
+            "elements": [],
+            "observation": "image",
+            "steps_without_image": 0,
+        },
+        "usage": {},
+    }
+
+
+SUBTASK_RECURSION_LIMIT = 30
+
+@monitored("subtask_worker")
+@accounted
+async def subtask_worker(state: SubtaskState):
+    """Runs one fanned-out sub-task to completion with its own agent, on its own leased tab."""
+    browser = await get_browser()
+    async with browser.lease_page():
+        sub_state = await build_initial_state(
+            browser,
+            task=state["task"],
+            user_id=state["user_id"],
+            session_id=state["session_id"],
+            parent_task=state["parent_task"],
+        )
+        usage = {}
+        try:
+            final_state = await subagent.ainvoke(sub_state, config={"recursion_limit": SUBTASK_RECURSION_LIMIT})
+            usage = final_state.get("usage", {})
+            result = {
+                "task": state["task"],
+                "status": final_state['execution_state']['status'],
+                "result": final_state['messages'][-1].content,
+                "history": final_state['execution_state']['history'],
+            }
+        except Exception as e:
+            result = {"task": state["task"], "status": "failed", "result": f"Sub-task failed: {e}", "history": []}
+    # The sub-task's spend counts towards the session that fanned it out
+    return {"subtask_results": [result], "usage": usage}
+
+
+@monitored("fan_in")
+@accounted
+async def fan_in(state: AgentState):
+    """Answers the fan_out tool call with the merged results of its sub-tasks."""
+    # Fanned out only as the message's single call, see `route_supervisor`
+    tool_call = state['messages'][-1].tool_calls[0]
+    results = state['subtask_results'][-len(tool_call["args"]["subtasks"]):]
+    return {
+        "execution_state": {"history": [f"Ran {len(results)} sub-tasks in parallel"]},
+        "messages": [ToolMessage(content=json.dumps(results), tool_call_id=tool_call["id"])],
+    }
+
+
+def route_supervisor(state: AgentState):
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None)
+    if not tool_calls:
+        return END
+    
+    # Only a fan_out call on its own, with sub-tasks, fans out. Otherwise (inside a sub-task, next to
+    # other calls, empty) it falls through to the tool, which answers why, and the other calls run as usual
+    fan_out_call = tool_calls[0] if len(tool_calls) == 1 and tool_calls[0]["name"] == "fan_out" else None
+    if fan_out_call and fan_out_call["args"].get("subtasks") and not state['execution_state'].get('parent_task'):
+        return [
+            Send("subtask_worker", {
+                "user_id": state["user_id"],
+                "session_id": state["session_id"],
+                "task": subtask,
+                "parent_task": state['execution_state']['task'],
+            })
+            for subtask in fan_out_call["args"]["subtasks"]
+        ]
+    return "browser_action_router"
     
     
     
@@ -98,16 +371,23 @@ builder = StateGraph(AgentState)
 builder.add_node("browser_supervisor", browser_supervisor)
 builder.add_node("browser_action_router", browser_action_router)
 builder.add_node("state_updater", state_updater)
+builder.add_node("subtask_worker", subtask_worker)
+builder.add_node("fan_in", fan_in)
 
 builder.add_edge(START, "browser_supervisor")
 builder.add_conditional_edges(
     "browser_supervisor",
-    lambda state: "browser_action_router" if getattr(state["messages"][-1], "tool_calls", None) else END
+    route_supervisor,
+    ["browser_action_router", "subtask_worker", END]
 )
 builder.add_edge("browser_action_router", "state_updater")
+builder.add_edge("subtask_worker", "fan_in")
+builder.add_edge("fan_in", "state_updater")
 builder.add_edge("state_updater", "browser_supervisor")
 
 
 
 checkpointer = InMemorySaver()
-agent = builder.compile(checkpointer=checkpointer)
\ No newline at end of file
+agent = builder.compile(checkpointer=checkpointer)
+# Sub-tasks run the same graph to completion inside a worker, without their own checkpoints
+subagent = builder.compile()
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Screenshot archival off the supervisor hot path.
+Frames are queued without blocking and written in batches by a background worker, one folder per session.
+When the queue is full, frames are dropped instead of stalling the agent.
+"""
+import asyncio
+import base64
+import os
+import tarfile
+from collections import defaultdict
+from typing import Optional, Union
+from ..utils.logger import agent_info, agent_warning, agent_error
+
+
+class ScreenshotArchive:
+    def __init__(self, root: str = "screenshots", max_queue: int = 64, batch_size: int = 8, compress: Optional[str] = None):
+        """
+        Args:
+            root: Folder holding one sub-folder of frames per session
+            max_queue: Frames waiting to be written before new ones are dropped
+            batch_size: Frames written per worker round trip to the thread pool
+            compress: Packing of a session on `finalize`: None, "tar" or "webp" (animated, needs Pillow)
+        """
+        self.root = root
+        self.batch_size = batch_size
+        self.compress = compress
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._steps = defaultdict(int)
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, session_id: str, frame: Union[str, bytes, memoryview], image_type: str = "png"):
+        """Queue a PNG or JPEG frame (raw, a frame store view, or base64) for the next step of a session. Never blocks."""
+        step = self._steps[session_id]
+        self._steps[session_id] += 1
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait((session_id, step, frame, image_type))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            agent_warning(f"Screenshot archive full, dropped frame {step} of session {session_id}")
+
+    def _session_dir(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id)
+
+    def _write_batch(self, batch):
+        for session_id, step, frame, image_type in batch:
+            folder = self._session_dir(session_id)
+            os.makedirs(folder, exist_ok=True)
+            data = base64.b64decode(frame) if isinstance(frame, str) else frame
+            with open(os.path.join(folder, f"step_{step:04d}.{'jpg' if image_type == 'jpeg' else image_type}"), "wb") as f:
+                f.write(data)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                agent_error(f"Error archiving screenshots: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def flush(self):
+        """Wait until every queued frame is written."""
+        await self._queue.join()
+
+    async def finalize(self, session_id: str) -> Optional[str]:
+        """Flush a session's frames and pack them according to `compress`. Returns the packed file, if any."""
+        await self.flush()
+        self._steps.pop(session_id, None)
+        folder = self._session_dir(session_id)
+        if not self.compress or not os.path.isdir(folder):
+            return None
+        try:
+            path = await asyncio.to_thread(self._pack, folder)
+            agent_info(f"Packed screenshots of session {session_id} into {path}")
+            return path
+        except Exception as e:
+            agent_error(f"Error packing screenshots of session {session_id}: {e}")
+            return None
+
+    def _pack(self, folder: str) -> str:
+        frames = sorted(name for name in os.listdir(folder) if name.endswith((".png", ".jpg")))
+        if self.compress == "tar":
+            path = f"{folder}.tar.gz"
+            with tarfile.open(path, "w:gz") as tar:
+                for name in frames:
+                    tar.add(os.path.join(folder, name), arcname=name)
+            return path
+        if self.compress == "webp":
+            from PIL import Image
+            path = f"{folder}.webp"
+            images = [Image.open(os.path.join(folder, name)).convert("RGB") for name in frames]
+            # Thumbnails are smaller than full frames, animation frames share one size
+            images = [image if image.size == images[0].size else image.resize(images[0].size) for image in images]
+            images[0].save(path, save_all=True, append_images=images[1:], duration=1000, quality=60)
+            return path
+        raise ValueError(f"Unknown screenshot compression '{self.compress}'")
+
+    async def close(self):
+        await self.flush()
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
@@ -0,0 +1,106 @@
+"""
+Frame store for screenshot history.
+Each session's screenshots are appended as raw encoded bytes (PNG or JPEG) to one file, next to an
+index of their offsets, and read back through a memory map. The state only keeps frame indexes.
+Consumers (the supervisor prompt, archival, progress fingerprints) get zero-copy `memoryview`
+slices, and frames are base64 encoded only where they leave the process, for the model provider
+or service clients. The files stay on disk for debugging after the session.
+"""
+import base64
+import json
+import mmap
+import os
+from typing import Optional
+
+
+class SessionFrames:
+    """Append-only frame file of one session, `frames.bin` with its `frames.idx` lines."""
+
+    def __init__(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        self._data = open(os.path.join(folder, "frames.bin"), "ab+")
+        self._index_file = open(os.path.join(folder, "frames.idx"), "a+")
+        # (offset, length, image type) per frame, reloaded when a session is reopened
+        self._index: list[tuple[int, int, str]] = []
+        self._index_file.seek(0)
+        for line in self._index_file:
+            entry = json.loads(line)
+            self._index.append((entry["offset"], entry["length"], entry["type"]))
+        self._map: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def append(self, data: bytes, image_type: str = "png") -> int:
+        """Append a frame and return its index. Synchronous, so concurrent tasks can't interleave writes."""
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(data)
+        self._data.flush()
+        self._index.append((offset, len(data), image_type))
+        self._index_file.write(json.dumps({"offset": offset, "length": len(data), "type": image_type}) + "\n")
+        self._index_file.flush()
+        return len(self._index) - 1
+
+    def view(self, index: int) -> memoryview:
+        offset, length, _ = self._index[index]
+        if self._map is None or offset + length > len(self._map):
+            # Remap over the grown file. Views of the previous map keep it alive until they're released
+            self._map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset:offset + length]
+
+    def image_type(self, index: int) -> str:
+        return self._index[index][2]
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Frames are still referenced (queued for the archive, ...), the map goes with the last view
+                pass
+            self._map = None
+        self._data.close()
+        self._index_file.close()
+
+
+class FrameStore:
+    def __init__(self, root: str = "frames"):
+        """
+        Args:
+            root: Folder holding one sub-folder of frames per session
+        """
+        self.root = root
+        self._sessions: dict[str, SessionFrames] = {}
+
+    def session(self, session_id: str) -> SessionFrames:
+        """Frames of a session, opened on first use and reopened with their index after `close`."""
+        if session_id not in self._sessions:
+            self._sessions[session_id] = SessionFrames(os.path.join(self.root, session_id))
+        return self._sessions[session_id]
+
+    def append(self, session_id: str, data: bytes, image_type: str = "png") -> int:
+        return self.session(session_id).append(data, image_type)
+
+    def view(self, session_id: str, index: int) -> memoryview:
+        """Zero-copy slice of a frame's encoded bytes."""
+        return self.session(session_id).view(index)
+
+    def image_type(self, session_id: str, index: int) -> str:
+        return self.session(session_id).image_type(index)
+
+    def b64(self, session_id: str, index: int) -> str:
+        """Base64 of a frame, for the model provider and service clients only."""
+        return base64.b64encode(self.view(session_id, index)).decode('utf-8')
+
+    def data_url(self, session_id: str, index: int) -> str:
+        return f"data:image/{self.image_type(session_id, index)};base64,{self.b64(session_id, index)}"
+
+    def close(self, session_id: Optional[str] = None):
+        """Close a session's files, or every session's. Frames stay on disk."""
+        for key in [session_id] if session_id else list(self._sessions):
+            frames = self._sessions.pop(key, None)
+            if frames:
+                frames.close()
+
+
+frame_store = FrameStore(os.getenv("FRAME_STORE_DIR") or "frames")
@@ -0,0 +1,192 @@
+"""
+Grounding service for label clicks.
+Finds the bounding boxes of labelled elements with the vision model, but sends it a compressed
+crop of the region where the labels likely are (from DOM text matches or the boxes found earlier
+on the same page) instead of the full-resolution frame. All labels the supervisor clicks in one
+message are grounded in one call, and results are cached per frame, so further clicks on the same
+frame don't call the model again.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Optional
+from google import genai
+from google.genai import types
+from .recording import ground
+from .offline import get_offline_model
+from ..browser.coordinates import FrameGeometry
+from ..browser.runtime import call_runtime
+from ..utils.logger import agent_debug, agent_warning
+from ..utils.accounting import count
+
+SYSTEM_INSTRUCTION = """
+You are a helpful assistant, expert in computer vision and spatial understanding.
+You will be provided with a screenshot of part of a web page and one or more labels describing clickable elements on that page like buttons, dropdowns, clickable text, etc.
+Your task is to identify and return the most appropriate bounding box of the clickable element matching each label in the screenshot.
+
+**Follow these guidelines:**
+1. Elements can be a button, link, input field, or any other clickable element.
+2. Generate correct bounding box coordinates for each element.
+3. If multiple elements match a label, return the most appropriate one.
+4. If no element matches a label, return [0, 0, 0, 0] for it.
+
+Each bounding box should be in the format: [ymin, xmin, ymax, xmax], normalized to 0-1000 over the screenshot.
+"""
+
+
+def frame_key(frame: str) -> str:
+    """Short digest identifying the frame the supervisor saw."""
+    return hashlib.blake2b(frame.encode(), digest_size=12).hexdigest()
+
+
+class GroundingService:
+    def __init__(self, model: str = "gemini-2.5-flash", padding: int = 160, min_region: int = 400, quality: int = 80, cache_size: int = 512, backend=None):
+        """
+        Args:
+            model: Vision model used for grounding
+            padding: CSS pixels kept around the hinted boxes of a crop
+            min_region: Smallest crop width and height in CSS pixels, so the model keeps some context
+            quality: JPEG quality of the image sent to the model
+            cache_size: Grounded points kept over all frames
+            backend: Offline model answering instead of Gemini, see offline.py. Used by default with MODEL_PROVIDER=offline
+        """
+        self.model = model
+        self.padding = padding
+        self.min_region = min_region
+        self.quality = quality
+        self.cache_size = cache_size
+        self.backend = backend
+        # (frame, label, description) -> CSS point, None when the model found nothing
+        self._points: OrderedDict[tuple, Optional[tuple[float, float]]] = OrderedDict()
+        # (url, label) -> CSS box of the last grounding, a hint for the next frames of the page
+        self._previous_boxes: dict[tuple, dict] = {}
+        self.calls = 0
+        self.cache_hits = 0
+
+    async def locate(self, browser, frame: str, targets: list[tuple[str, str]]) -> dict[tuple[str, str], Optional[tuple[float, float]]]:
+        """CSS viewport points for (label, description) targets on `frame`, grounding the uncached ones in one model call."""
+        points = {}
+        missing = []
+        for target in dict.fromkeys(targets):
+            key = (frame, *target)
+            if key in self._points:
+                self._points.move_to_end(key)
+                points[target] = self._points[key]
+                self.cache_hits += 1
+                count("grounding_cache_hits")
+            else:
+                missing.append(target)
+        if not missing:
+            return points
+
+        region = await self._region(browser, [label for label, _ in missing])
+        found = await self._ground(browser, missing, region)
+        not_found = [target for target in missing if found[target] is None]
+        if region is not None and not_found:
+            # A wrong hint crops the element out, look at the whole viewport once before giving up
+            agent_debug(f"Grounding found nothing for {len(not_found)} labels in the crop, retrying on the full viewport")
+            found.update(await self._ground(browser, not_found, None))
+
+        for target in missing:
+            points[target] = found[target]
+            self._points[(frame, *target)] = found[target]
+        while len(self._points) > self.cache_size:
+            self._points.popitem(last=False)
+        return points
+
+    async def _ground(self, browser, targets: list[tuple[str, str]], region: Optional[dict]) -> dict[tuple[str, str], Optional[tuple[float, float]]]:
+        """CSS points of the targets on a capture of `region`, None for the ones the model didn't find."""
+        shot = await browser.screenshot_frame(clip=region, scale="css", quality=self.quality)
+        if not shot.success:
+            raise RuntimeError(shot.message)
+        geometry: FrameGeometry = shot.data["geometry"]
+        boxes = await self._request(shot.data["screenshot"], targets)
+
+        points = {}
+        for target, box in zip(targets, boxes):
+            point = None
+            if box and any(box):
+                ymin, xmin, ymax, xmax = box
+                left, top = geometry.normalized_to_css(xmin, ymin)
+                right, bottom = geometry.normalized_to_css(xmax, ymax)
+                point = ((left + right) / 2, (top + bottom) / 2)
+                self._previous_boxes[(browser.page.url, target[0])] = {"x": left, "y": top, "width": right - left, "height": bottom - top}
+            points[target] = point
+        return points
+
+    async def _region(self, browser, labels: list[str]) -> Optional[dict]:
+        """Crop around DOM text matches or previous boxes of the labels, None for the full viewport."""
+        try:
+            hints = await call_runtime(browser.page, "locateText", {"texts": labels, "limit": 3})
+        except Exception as e:
+            agent_warning(f"Error locating grounding hints: {e}")
+            hints = [[] for _ in labels]
+
+        boxes = []
+        for label, matches in zip(labels, hints):
+            if matches:
+                boxes += matches
+            elif (browser.page.url, label) in self._previous_boxes:
+                boxes.append(self._previous_boxes[(browser.page.url, label)])
+            else:
+                # A label without any hint could be anywhere on the page
+                return None
+
+        width, height = browser.viewport_width, browser.viewport_height
+        left = max(0, min(box["x"] for box in boxes) - self.padding)
+        top = max(0, min(box["y"] for box in boxes) - self.padding)
+        right = min(width, max(box["x"] + box["width"] for box in boxes) + self.padding)
+        bottom = min(height, max(box["y"] + box["height"] for box in boxes) + self.padding)
+        # Grow small crops around their center, within the viewport
+        if right - left < self.min_region:
+            left = max(0, min((left + right - self.min_region) / 2, width - self.min_region))
+            right = min(width, left + self.min_region)
+        if bottom - top < self.min_region:
+            top = max(0, min((top + bottom - self.min_region) / 2, height - self.min_region))
+            bottom = min(height, top + self.min_region)
+        if (right - left) * (bottom - top) > 0.8 * width * height:
+            return None
+        return {"x": left, "y": top, "width": right - left, "height": bottom - top}
+
+    async def _request(self, image: bytes, targets: list[tuple[str, str]]) -> list[Optional[list[float]]]:
+        """One model call for all targets, a box per target in order."""
+        listing = "\n".join(f"{i + 1}. label: '{label}', description: '{description}'" for i, (label, description) in enumerate(targets))
+        prompt = (
+            f"Bounding boxes for these labels:\n{listing}\n"
+            "Return a JSON list with one [ymin, xmin, ymax, xmax] box per label, in the same order, normalized to 0-1000."
+        )
+        image_part = types.Part(inline_data=types.Blob(mime_type="image/jpeg", data=image))
+
+        async def request() -> str:
+            # The async client, a blocking call would hold up every session on the event loop
+            response = await genai.Client(api_key=os.getenv("GENAI_API_KEY")).aio.models.generate_content(
+                model=self.model,
+                contents=[image_part, prompt],
+                config=types.GenerateContentConfig(response_mime_type="application/json", system_instruction=SYSTEM_INSTRUCTION),
+            )
+            metadata = response.usage_metadata
+            count("input_tokens", getattr(metadata, "prompt_token_count", None) or 0)
+            count("output_tokens", getattr(metadata, "candidates_token_count", None) or 0)
+            return response.text
+
+        if self.backend is None and os.getenv("MODEL_PROVIDER") == "offline":
+            self.backend = get_offline_model()
+        self.calls += 1
+        count("grounding_calls")
+        count("model_calls", per="grounding")
+        count("image_bytes", len(image))
+        agent_debug(f"Grounding {len(targets)} labels on a {len(image) // 1024}KB image")
+        if self.backend:
+            response_text = await self.backend.ground(image, [label for label, _ in targets])
+        else:
+            # Recorded under the joined labels, a batch replays as one response
+            response_text = await ground("; ".join(label for label, _ in targets), "; ".join(description for _, description in targets), request)
+        boxes = json.loads(response_text)
+        # A single label may come back as a bare box
+        if len(targets) == 1 and len(boxes) == 4 and all(isinstance(value, (int, float)) for value in boxes):
+            boxes = [boxes]
+        return [box if isinstance(box, list) and len(box) == 4 else None for box in boxes] + [None] * (len(targets) - len(boxes))
+
+
+grounding = GroundingService()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Record and replay harness for performance regression testing.
+
+    python -m src.agent.harness record recordings/search "search for playwright on bing" --url https://www.bing.com
+    python -m src.agent.harness replay recordings/search --timings build_a.json
+    python -m src.agent.harness compare build_a.json build_b.json
+
+Recording runs the agent live and saves model and grounding responses plus a HAR of the network.
+Replay runs the real graph and browser against that recording, without network or live models,
+and writes the step timings. Compare prints the step-by-step timing differences of two runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from .agent import agent, build_initial_state
+from .recording import SessionRecording, current_recording
+from ..browser import initialize_browser, close_browser
+
+
+async def _run(recording: SessionRecording, browser_options: dict) -> SessionRecording:
+    task, url = recording.meta["task"], recording.meta["url"]
+    browser = await initialize_browser(**browser_options)
+    token = current_recording.set(recording)
+    try:
+        await browser.navigate(url)
+        initial_state = await build_initial_state(browser, task=task, user_id="harness", session_id=str(uuid.uuid4()))
+        config = {"recursion_limit": recording.meta.get("recursion_limit", 50), "configurable": {"thread_id": str(uuid.uuid4())}}
+
+        # Each update marks the end of one node, its duration is the time since the previous one
+        last = time.monotonic()
+        async for update in agent.astream(initial_state, config=config, stream_mode="updates"):
+            now = time.monotonic()
+            for node, node_update in update.items():
+                if node == "__interrupt__":
+                    raise RuntimeError("Sessions with human interaction can't be recorded")
+                recording.record_step(node, now - last, node_update)
+            last = now
+    finally:
+        current_recording.reset(token)
+        await close_browser()
+    return recording
+
+
+async def record(directory: str, task: str, url: str, recursion_limit: int = 50, **browser_options) -> str:
+    recording = SessionRecording(directory, mode="record")
+    recording.meta = {"task": task, "url": url, "recursion_limit": recursion_limit}
+    await _run(recording, {"record_har_path": recording.har_path, **browser_options})
+    return recording.save()
+
+
+async def replay(directory: str, timings_file: str = None, simulate_latency: bool = False, **browser_options) -> str:
+    recording = SessionRecording(directory, mode="replay", simulate_latency=simulate_latency)
+    await _run(recording, {"replay_har_path": recording.har_path, **browser_options})
+    return recording.save(timings_file)
+
+
+def compare(baseline_file: str, candidate_file: str) -> str:
+    """Step-by-step timing differences between two runs of the same recording."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    with open(candidate_file) as f:
+        candidate = json.load(f)
+
+    lines = [f"{'step':>4}  {'node':<24}{'baseline ms':>12}{'candidate ms':>14}{'delta ms':>10}{'delta %':>9}"]
+    for before, after in zip(baseline, candidate):
+        node = before["node"] if before["node"] == after["node"] else f"{before['node']}/{after['node']}"
+        a, b = before["duration"] * 1000, after["duration"] * 1000
+        change = f"{(b - a) / a * 100:+.1f}" if a else "-"
+        lines.append(f"{before['index']:>4}  {node:<24}{a:>12.1f}{b:>14.1f}{b - a:>+10.1f}{change:>9}")
+
+    total_a = sum(step["duration"] for step in baseline) * 1000
+    total_b = sum(step["duration"] for step in candidate) * 1000
+    lines.append(f"{'':>4}  {'total':<24}{total_a:>12.1f}{total_b:>14.1f}{total_b - total_a:>+10.1f}")
+    if len(baseline) != len(candidate):
+        lines.append(f"Runs diverged: {len(baseline)} vs {len(candidate)} steps")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Run a task live and record it")
+    record_parser.add_argument("directory")
+    record_parser.add_argument("task")
+    record_parser.add_argument("--url", default="https://www.bing.com")
+    record_parser.add_argument("--recursion-limit", type=int, default=50)
+
+    replay_parser = commands.add_parser("replay", help="Replay a recording offline and write its step timings")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--timings", help="Where to write the step timings")
+    replay_parser.add_argument("--simulate-latency", action="store_true", help="Sleep for the recorded model latencies")
+
+    compare_parser = commands.add_parser("compare", help="Compare the step timings of two runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        path = asyncio.run(record(args.directory, args.task, args.url, args.recursion_limit))
+        print(f"Recorded {os.path.abspath(args.directory)}, timings in {path}")
+    elif args.command == "replay":
+        path = asyncio.run(replay(args.directory, args.timings, args.simulate_latency))
+        print(f"Replayed {os.path.abspath(args.directory)}, timings in {path}")
+    else:
+        print(compare(args.baseline, args.candidate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-step observation classifier.
+Decides from cheap signals whether the supervisor needs a fresh full screenshot, a downscaled
+thumbnail, or only the text state (DOM changes, focus, tool results) for its next step. Typing into
+a focused field or small in-place updates don't need a new image. Navigation, failures and large
+page changes do.
+"""
+from typing import Literal, Optional
+from ..browser.dom import NO_CHANGES
+
+Observation = Literal["image", "thumbnail", "text"]
+
+# Actions whose effect the DOM changes describe well, as long as the page stays put
+TEXT_ACTIONS = {"type", "press_keys", "wait", "list_tabs"}
+
+
+class ObservationPolicy:
+    def __init__(self, text_max_lines: int = 20, thumbnail_max_lines: int = 80, max_without_image: int = 3):
+        """
+        Args:
+            text_max_lines: DOM diff lines up to which a text action is observed as text only
+            thumbnail_max_lines: DOM diff lines up to which a thumbnail is enough
+            max_without_image: Consecutive steps without a full image before one is forced
+        """
+        self.text_max_lines = text_max_lines
+        self.thumbnail_max_lines = thumbnail_max_lines
+        self.max_without_image = max_without_image
+
+    def classify(
+        self,
+        previous_url: Optional[str],
+        url: str,
+        dom: str,
+        dom_full: bool,
+        focused: Optional[dict],
+        tool_names: list[str],
+        failed: bool,
+        steps_without_image: int,
+    ) -> Observation:
+        # Navigation, failures, and drift after several steps without an image need a full look
+        if failed or dom_full or url != previous_url or not tool_names or steps_without_image >= self.max_without_image:
+            return "image"
+        changed_lines = 0 if dom == NO_CHANGES else dom.count("\n") + 1
+        editing = bool(focused) and ((focused.get("tag") or "").upper() in ("INPUT", "TEXTAREA") or bool(focused.get("isContentEditable")))
+        if set(tool_names) <= TEXT_ACTIONS and (editing or changed_lines == 0) and changed_lines <= self.text_max_lines:
+            return "text"
+        if changed_lines <= self.thumbnail_max_lines:
+            return "thumbnail"
+        return "image"
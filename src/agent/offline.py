@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Offline model backend.
+Stands in for the supervisor model and the grounding model without network access. It answers
+with scripted tool calls and bounding boxes after latencies drawn from configurable distributions.
+It runs in process (`OfflineModel`) or as a local HTTP server (`serve`) reached through
+`OfflineHTTPModel`, which has the same interface. Selected with MODEL_PROVIDER=offline, with the
+script in OFFLINE_MODEL_SCRIPT and its variables in OFFLINE_MODEL_VARS (`base_url=http://...,name=value`),
+and OFFLINE_MODEL_URL to use a running server. The supervisor and grounding share one backend, and
+so its concurrency limit, OFFLINE_MODEL_MAX_INFLIGHT.
+
+    python -m src.agent.offline serve script.json --port 8765
+
+Script format:
+
+    {
+        "steps": [{"name": "navigate_to_url", "args": {"url": "{base_url}/list.html"}}, ...],
+        "boxes": {"Search": [ymin, xmin, ymax, xmax]},
+        "default_box": [450, 450, 550, 550],
+        "latency": {"supervisor": {"mean": 0.8, "jitter": 0.3}, "grounding": {"mean": 0.4, "distribution": "lognormal"}}
+    }
+
+Every session (told apart by its goal) walks through `steps`, repeating the last one.
+Script variables like `{base_url}` are replaced in string arguments, other braces are kept as they are.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class Latency:
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, distribution: str = "normal"):
+        """
+        Args:
+            mean: Mean latency in seconds
+            jitter: Standard deviation in seconds
+            distribution: 'fixed', 'normal' (clipped at 0) or 'lognormal' (long tail, same mean and deviation)
+        """
+        self.mean = mean
+        self.jitter = jitter
+        self.distribution = distribution
+
+    def sample(self) -> float:
+        if self.distribution == "fixed" or not self.jitter or not self.mean:
+            return self.mean
+        if self.distribution == "lognormal":
+            sigma2 = math.log(1 + (self.jitter / self.mean) ** 2)
+            return random.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2))
+        return max(0.0, random.gauss(self.mean, self.jitter))
+
+
+class OfflineScript:
+    """Scripted answers, shared by the in-process model and the server."""
+
+    def __init__(self, steps: list[dict], boxes: Optional[dict] = None, default_box: Optional[list] = None, latency: Optional[dict] = None, variables: Optional[dict] = None):
+        self.steps = steps or [{"name": "exit", "args": {"reason": "Offline script is empty", "success": False}}]
+        self.boxes = boxes or {}
+        self.default_box = default_box or [450, 450, 550, 550]
+        latency = latency or {}
+        self.supervisor_latency = Latency(**latency.get("supervisor", {}))
+        self.grounding_latency = Latency(**latency.get("grounding", {}))
+        self.variables = variables or {}
+        self._positions: dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str, **variables) -> "OfflineScript":
+        with open(path) as f:
+            script = json.load(f)
+        return cls(**script, variables=variables)
+
+    def _format(self, value):
+        if isinstance(value, str):
+            return re.sub(r"\{(\w+)\}", lambda match: str(self.variables.get(match[1], match[0])), value)
+        if isinstance(value, list):
+            return [self._format(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._format(item) for key, item in value.items()}
+        return value
+
+    def next_call(self, session: str) -> dict:
+        step = self._positions.get(session, 0)
+        self._positions[session] = step + 1
+        scripted = self.steps[min(step, len(self.steps) - 1)]
+        return {"name": scripted["name"], "args": self._format(scripted.get("args", {})), "id": f"call_{uuid.uuid4().hex[:8]}"}
+
+    def boxes_for(self, labels: list[str]) -> list[list]:
+        return [self.boxes.get(label, self.default_box) for label in labels]
+
+
+def session_of(messages: list) -> str:
+    """The supervisor's goal text, which identifies a session."""
+    content = messages[-1].content
+    return str(content[0]["text"] if isinstance(content, list) else content)
+
+
+class OfflineModel:
+    """In-process stand-in for the chat model and the grounding model, with a provider concurrency limit."""
+
+    def __init__(self, script: OfflineScript, max_inflight: int = 8):
+        self.script = script
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self.queue_waits: list[float] = []
+
+    def bind_tools(self, tools):
+        return self
+
+    async def _wait(self, latency: Latency):
+        queued = time.monotonic()
+        async with self._inflight:
+            self.queue_waits.append(time.monotonic() - queued)
+            await asyncio.sleep(latency.sample())
+
+    async def ainvoke(self, messages):
+        await self._wait(self.script.supervisor_latency)
+        return AIMessage(content="", tool_calls=[self.script.next_call(session_of(messages))])
+
+    async def astream(self, messages):
+        message = await self.ainvoke(messages)
+        call = message.tool_calls[0]
+        yield AIMessageChunk(content="", tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}])
+
+    async def ground(self, image: bytes, labels: list[str]) -> str:
+        """Grounding response text, a JSON list of boxes in label order."""
+        await self._wait(self.script.grounding_latency)
+        return json.dumps(self.script.boxes_for(labels))
+
+
+class OfflineHTTPModel:
+    """Client of a server started with `serve`, with the same interface as `OfflineModel`."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def bind_tools(self, tools):
+        return self
+
+    def _post(self, path: str, payload: dict) -> dict:
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    async def ainvoke(self, messages):
+        call = await asyncio.to_thread(self._post, "/chat", {"session": session_of(messages)})
+        return AIMessage(content="", tool_calls=[call])
+
+    async def astream(self, messages):
+        message = await self.ainvoke(messages)
+        call = message.tool_calls[0]
+        yield AIMessageChunk(content="", tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}])
+
+    async def ground(self, image: bytes, labels: list[str]) -> str:
+        response = await asyncio.to_thread(self._post, "/ground", {"labels": labels, "image_bytes": len(image)})
+        return json.dumps(response["boxes"])
+
+
+_offline_model = None
+
+
+def parse_variables(pairs: list[str]) -> dict:
+    """Script variables from `name=value` pairs."""
+    return dict(pair.split("=", 1) for pair in pairs if pair)
+
+
+def get_offline_model():
+    """Offline backend configured by OFFLINE_MODEL_URL or OFFLINE_MODEL_SCRIPT, one per process."""
+    global _offline_model
+    if _offline_model is None:
+        if os.getenv("OFFLINE_MODEL_URL"):
+            _offline_model = OfflineHTTPModel(os.getenv("OFFLINE_MODEL_URL"))
+        else:
+            path = os.getenv("OFFLINE_MODEL_SCRIPT")
+            variables = parse_variables(os.getenv("OFFLINE_MODEL_VARS", "").split(","))
+            script = OfflineScript.load(path, **variables) if path else OfflineScript(steps=[], variables=variables)
+            _offline_model = OfflineModel(script, max_inflight=int(os.getenv("OFFLINE_MODEL_MAX_INFLIGHT", "8")))
+    return _offline_model
+
+
+def serve(script: OfflineScript, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Serve the script over HTTP in a background thread, each request sleeping its sampled latency."""
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/chat":
+                with lock:
+                    body = script.next_call(payload["session"])
+                time.sleep(script.supervisor_latency.sample())
+            elif self.path == "/ground":
+                body = {"boxes": script.boxes_for(payload["labels"])}
+                time.sleep(script.grounding_latency.sample())
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline model server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Serve a script over HTTP")
+    serve_parser.add_argument("script")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--var", action="append", default=[], help="Script variable as name=value")
+    args = parser.parse_args()
+
+    variables = parse_variables(args.var)
+    server = serve(OfflineScript.load(args.script, **variables), args.host, args.port)
+    print(f"Offline model serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
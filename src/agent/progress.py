@@ -0,0 +1,140 @@
+"""
+Loop and stall detection with a circuit breaker.
+Each step records the action taken and a fingerprint of the page it led to. When the run keeps
+failing, repeats an action without the page changing, oscillates between two actions, or the
+page stops changing altogether, the breaker trips and escalates the strategy: first from
+screenshot grounding to the marked element table, then to a stronger model, and finally ends the
+run, instead of spending the remaining recursion budget on the same mistake.
+"""
+import hashlib
+import json
+import os
+from typing import Optional, Union
+from ..browser.dom import NO_CHANGES
+from ..utils.logger import agent_warning
+
+# Escalation order of the breaker, the run ends after the last strategy trips
+STRATEGIES = ["default", "dom", "escalated_model"]
+
+# What the supervisor is told when the breaker switches to a strategy
+STRATEGY_NOTES = {
+    "dom": "Switched to the marked element table: click elements by their number with click_element",
+    "escalated_model": "Switched to a stronger model",
+}
+
+# Graph supersteps per agent step: supervisor, action router, state updater
+SUPERSTEPS_PER_STEP = 3
+
+# Totals over all runs in this process
+breaker_metrics = {"trips": 0, "strategy_switches": 0, "runs_stopped": 0, "steps_saved": 0}
+
+
+class BreakerConfig:
+    def __init__(self, max_failures: int = 3, max_repeats: int = 3, max_unchanged: int = 5):
+        """
+        Args:
+            max_failures: Consecutive failed actions before tripping
+            max_repeats: Same action on an unchanged page before tripping
+            max_unchanged: Steps without any page change before tripping
+        """
+        self.max_failures = max_failures
+        self.max_repeats = max_repeats
+        self.max_unchanged = max_unchanged
+
+    @classmethod
+    def from_env(cls) -> "BreakerConfig":
+        return cls(
+            max_failures=int(os.getenv("BREAKER_MAX_FAILURES", "3")),
+            max_repeats=int(os.getenv("BREAKER_MAX_REPEATS", "3")),
+            max_unchanged=int(os.getenv("BREAKER_MAX_UNCHANGED", "5")),
+        )
+
+
+def action_signature(message) -> str:
+    """Tool calls of a supervisor message, in a form equal for equal actions."""
+    calls = getattr(message, "tool_calls", None) or []
+    return ";".join(f"{call['name']}({json.dumps(call['args'], sort_keys=True)})" for call in calls)
+
+
+def step_record(message, url: str, screenshot: Union[str, bytes, memoryview], dom_structure: str) -> dict:
+    """Action taken and fingerprint of the page it led to, compared across steps by the detector."""
+    return {
+        "action": action_signature(message),
+        "url": url,
+        "screen": hashlib.blake2b(screenshot.encode() if isinstance(screenshot, str) else screenshot, digest_size=8).hexdigest(),
+        "dom_changed": dom_structure != NO_CHANGES,
+    }
+
+
+def _unchanged(previous: dict, step: dict) -> bool:
+    # Both have to stay put: scrolling a static page changes the pixels without any DOM mutation
+    return previous["url"] == step["url"] and previous["screen"] == step["screen"] and not step["dom_changed"]
+
+
+def detect_loop(execution_state: dict, config: BreakerConfig) -> Optional[str]:
+    """Reason the breaker should trip, looking only at steps since the last trip, or None while the run progresses."""
+    steps = execution_state.get("steps", [])[execution_state.get("breaker_from", 0):]
+    failures = execution_state.get("consecutive_failures", 0)
+    if failures >= config.max_failures:
+        return f"{failures} consecutive failed actions"
+
+    unchanged = 0
+    for previous, step in zip(reversed(steps[:-1]), reversed(steps[1:])):
+        if not _unchanged(previous, step):
+            break
+        unchanged += 1
+
+    recent = steps[-config.max_repeats:]
+    if (
+        len(recent) == config.max_repeats
+        and unchanged >= config.max_repeats - 1
+        and len({step["action"] for step in recent}) == 1
+    ):
+        return f"repeated {recent[-1]['action']} {config.max_repeats} times without the page changing"
+
+    last = steps[-4:]
+    if (
+        len(last) == 4
+        and last[0]["action"] != last[1]["action"]
+        and [s["action"] for s in last[:2]] == [s["action"] for s in last[2:]]
+        and [s["screen"] for s in last[:2]] == [s["screen"] for s in last[2:]]
+    ):
+        return f"oscillating between {last[0]['action']} and {last[1]['action']}"
+
+    if unchanged >= config.max_unchanged:
+        return f"page unchanged for {unchanged} steps"
+    return None
+
+
+def available_strategies() -> list[str]:
+    """Strategies the breaker can escalate to, the stronger model only when ESCALATION_MODEL_NAME is set."""
+    return [strategy for strategy in STRATEGIES if strategy != "escalated_model" or os.getenv("ESCALATION_MODEL_NAME")]
+
+
+def trip(execution_state: dict, reason: str, recursion_limit: int) -> dict:
+    """Execution state update escalating to the next strategy, or ending the run after the last one."""
+    steps = len(execution_state.get("steps", []))
+    breaker = dict(execution_state.get("breaker") or {"trips": [], "steps_saved": 0})
+    strategy = execution_state.get("strategy", STRATEGIES[0])
+    strategies = available_strategies()
+    index = strategies.index(strategy) + 1 if strategy in strategies else len(strategies)
+    breaker["trips"] = breaker["trips"] + [{"step": steps, "strategy": strategy, "reason": reason}]
+    breaker_metrics["trips"] += 1
+
+    if index < len(strategies):
+        breaker_metrics["strategy_switches"] += 1
+        agent_warning(f"Circuit breaker tripped at step {steps} ({reason}), switching from {strategy} to {strategies[index]}")
+        return {
+            "strategy": strategies[index],
+            "breaker_from": steps,
+            "consecutive_failures": 0,
+            "breaker": breaker,
+            "errors": [f"Stuck: {reason}. {STRATEGY_NOTES[strategies[index]]}, try a different approach."],
+        }
+
+    # Steps the run would otherwise have spent before hitting the recursion limit
+    breaker["steps_saved"] = max(0, recursion_limit // SUPERSTEPS_PER_STEP - steps)
+    breaker_metrics["runs_stopped"] += 1
+    breaker_metrics["steps_saved"] += breaker["steps_saved"]
+    agent_warning(f"Circuit breaker ended the run at step {steps} ({reason}), saving up to {breaker['steps_saved']} steps")
+    return {"status": "failed", "exit_reason": f"Stopped: {reason}", "breaker": breaker, "errors": [f"Stopped: {reason}"]}
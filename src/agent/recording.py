@@ -0,0 +1,163 @@
+"""
+Session recording and deterministic replay.
+While recording, every supervisor model call, grounding response and graph step is captured into
+a recording folder, next to a HAR of the network traffic. While replaying, the recorded model and
+grounding responses are fed back in order, so the real graph and browser run without live models.
+"""
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from .streaming import node_updates
+from ..utils.logger import agent_warning
+
+RECORDING_FILE = "recording.json"
+HAR_FILE = "network.har"
+
+
+class SessionRecording:
+    def __init__(self, directory: str, mode: str = "record", simulate_latency: bool = False):
+        """
+        Args:
+            directory: Folder holding `recording.json` and `network.har`
+            mode: "record" to capture a live session, "replay" to feed a captured one back
+            simulate_latency: When replaying, sleep for the recorded model and grounding latencies
+        """
+        self.directory = directory
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.meta: dict = {}
+        self.model_calls: list[dict] = []
+        self.grounding_calls: list[dict] = []
+        self.steps: list[dict] = []
+        self._model_cursor = 0
+        self._grounding_cursor = 0
+
+        if mode == "replay":
+            with open(os.path.join(directory, RECORDING_FILE)) as f:
+                recorded = json.load(f)
+            self.meta = recorded["meta"]
+            self.model_calls = recorded["model_calls"]
+            self.grounding_calls = recorded["grounding_calls"]
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def har_path(self) -> str:
+        return os.path.join(self.directory, HAR_FILE)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    async def _replayed(self, calls: list[dict], cursor: int, kind: str) -> dict:
+        if cursor >= len(calls):
+            raise RuntimeError(f"Replay ran out of recorded {kind} calls after {len(calls)}")
+        call = calls[cursor]
+        if self.simulate_latency:
+            await asyncio.sleep(call["latency"])
+        return call
+
+    @staticmethod
+    def _serialized_input(messages: list, frames: dict[str, dict]) -> list[dict]:
+        """Input messages as dicts, their images replaced by references into the frame store."""
+        serialized = messages_to_dict(messages)
+        for message in serialized:
+            content = message["data"].get("content")
+            if isinstance(content, list):
+                message["data"]["content"] = [
+                    {"type": "frame", **frames.get(block["image_url"]["url"], {})}
+                    if isinstance(block, dict) and block.get("type") == "image_url" else block
+                    for block in content
+                ]
+        return serialized
+
+    async def call_model(self, runnable, messages: list, node: str, frames: Optional[dict[str, dict]] = None):
+        if self.replaying:
+            call = await self._replayed(self.model_calls, self._model_cursor, "model")
+            self._model_cursor += 1
+            if call["node"] != node:
+                agent_warning(f"Replay diverged: recorded model call from {call['node']}, now from {node}")
+            return messages_from_dict([call["output"]])[0]
+
+        start = time.monotonic()
+        response = await runnable.ainvoke(messages)
+        self.model_calls.append({
+            "node": node,
+            "latency": time.monotonic() - start,
+            "input_chars": sum(len(str(message.content)) for message in messages),
+            "input": self._serialized_input(messages, frames or {}),
+            "output": messages_to_dict([response])[0],
+        })
+        return response
+
+    async def ground(self, label: str, description: str, request: Callable[[], Awaitable[str]]) -> str:
+        if self.replaying:
+            call = await self._replayed(self.grounding_calls, self._grounding_cursor, "grounding")
+            self._grounding_cursor += 1
+            if call["label"] != label:
+                agent_warning(f"Replay diverged: recorded grounding of '{call['label']}', now '{label}'")
+            return call["response"]
+
+        start = time.monotonic()
+        response = await request()
+        self.grounding_calls.append({
+            "label": label,
+            "description": description,
+            "latency": time.monotonic() - start,
+            "response": response,
+        })
+        return response
+
+    def record_step(self, node: str, duration: float, update):
+        self.steps.append({
+            "index": len(self.steps),
+            "node": node,
+            "duration": duration,
+            # Tool results, as returned to the supervisor
+            "tool_results": [
+                str(message.content) for item in node_updates(update) for message in item.get("messages", [])
+                if getattr(message, "type", None) == "tool"
+            ],
+        })
+
+    def save(self, timings_file: Optional[str] = None):
+        """Write the recording (in record mode) and the step timings of this run."""
+        if not self.replaying:
+            with open(os.path.join(self.directory, RECORDING_FILE), "w") as f:
+                json.dump({
+                    "meta": self.meta,
+                    "model_calls": self.model_calls,
+                    "grounding_calls": self.grounding_calls,
+                }, f, indent=2)
+        timings_file = timings_file or os.path.join(self.directory, f"timings_{self.mode}.json")
+        with open(timings_file, "w") as f:
+            json.dump(self.steps, f, indent=2)
+        return timings_file
+
+
+# Recording of the running session, set by the harness and inherited by the graph's node tasks
+current_recording: ContextVar[Optional[SessionRecording]] = ContextVar("current_recording", default=None)
+
+
+async def invoke_model(runnable, messages: list, node: str, frames: Optional[dict[str, dict]] = None):
+    """
+    Call a chat model, through the active recording if there is one.
+    `frames` maps the data URLs of the messages' images to their frame store reference (session_id, index),
+    which the recording stores instead of the images.
+    """
+    recording = current_recording.get()
+    if recording is None:
+        return await runnable.ainvoke(messages)
+    return await recording.call_model(runnable, messages, node, frames)
+
+
+async def ground(label: str, description: str, request: Callable[[], Awaitable[str]]) -> str:
+    """Run a grounding request returning the raw model text, through the active recording if there is one."""
+    recording = current_recording.get()
+    if recording is None:
+        return await request()
+    return await recording.ground(label, description, request)
@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, TypedDict, Annotated
+from typing import Optional, List, TypedDict, Annotated, Literal
 from langgraph.graph.message import add_messages
+from langgraph.prebuilt import InjectedState
+import operator
+from ..utils.accounting import merge_usage
 from enum import Enum
 
 class ExecutionStatus(str, Enum):
@@ -11,20 +14,55 @@ class ExecutionStatus(str, Enum):
     INTERRUPTED = "interrupted"
     CANCELLED = "cancelled"
 
-class ExecutionState:
+# Execution and page state live in the checkpointed graph state as plain dicts,
+# typed so the structure is explicit without a model object per step
+class ExecutionState(TypedDict, total=False):
     task: str
     history: list[str]
     errors: list[str]
-    consecutive_failures: int = 2
-    status: ExecutionStatus
+    consecutive_failures: int
+    status: ExecutionStatus # 'completed' or 'failed' once the agent exits or is stopped
+    exit_reason: str # why it exited, from the exit tool or the circuit breaker
+    parent_task: Optional[str] # set when running as a fanned-out sub-task
+    steps: list[dict] # action and page fingerprint per step, for the loop detector
+    strategy: str # current circuit breaker strategy
+    breaker_from: int # first step the loop detector looks at, after the last trip
+    breaker: dict # circuit breaker trips and steps saved
     
-class PageState:
+class PageState(TypedDict, total=False):
     page_title: str
     url: str
     dom_structure: str
     viewport_width: int
     viewport_height: int
-    screenshots: list[str]
+    screenshots: list[int] # Indexes of the session's frames in the frame store, see frames.py
+    geometry: dict # FrameGeometry of the latest screenshot
+    elements: list[dict]
+    observation: str # 'image', 'thumbnail' or 'text', see observation.py
+    steps_without_image: int
+
+def update_execution_state(current: ExecutionState, update: dict) -> ExecutionState:
+    """
+    Reducer merging execution state updates, also from tools running concurrently.
+    `history`, `errors` and `steps` are appended, `failed: True` counts a consecutive failure and
+    `failed: False` resets the count, other keys are replaced.
+    """
+    merged = dict(current or {})
+    for key, value in update.items():
+        if key in ("history", "errors", "steps") and current:
+            merged[key] = current.get(key, []) + value
+        elif key == "failed":
+            merged["consecutive_failures"] = merged.get("consecutive_failures", 0) + 1 if value else 0
+        else:
+            merged[key] = value
+    return merged
+
+def update_browser_state(current: PageState, update: dict) -> PageState:
+    """Reducer merging page state updates, `screenshots` are appended and other keys replaced."""
+    merged = {**(current or {}), **update}
+    if current and "screenshots" in update:
+        merged["screenshots"] = current.get("screenshots", []) + update["screenshots"]
+    return merged
 
 class AgentState(TypedDict):
     # identity state
@@ -32,9 +70,19 @@ class AgentState(TypedDict):
     session_id: str
     messages: Annotated[list[dict], add_messages]
     # execution state
-    execution_state: ExecutionState
+    execution_state: Annotated[ExecutionState, update_execution_state]
     # page state 
-    browser_state: PageState # 'll only track the current page state
+    browser_state: Annotated[PageState, update_browser_state] # 'll only track the current page state
+    # results of fanned-out sub-tasks, merged from the parallel workers
+    subtask_results: Annotated[list[dict], operator.add]
+    # resources spent by the session, summed from the nodes' usage updates
+    usage: Annotated[dict, merge_usage]
+
+class SubtaskState(TypedDict):
+    user_id: str
+    session_id: str
+    task: str
+    parent_task: str
 
 
 class UrlSchema(BaseModel):
@@ -54,7 +102,12 @@ class PressKeysSchema(BaseModel):
 
 class InteractionSchema(BaseModel):
     query: str = Field(..., description="The query or question to ask the user for input or clarification.")
-  
+
+class FanOutSchema(BaseModel):
+    subtasks: list[str] = Field(..., description="Independent, self-contained sub-tasks to run in parallel, each in its own tab. For example: ['Find the price of the iPhone 15 on amazon.com', 'Find the price of the iPhone 15 on bestbuy.com']")
+    # Injected by the ToolNode, the tool answers fan_out calls the graph doesn't fan out
+    state: Annotated[dict, InjectedState]
+
 class WaitSchema(BaseModel):
     seconds: int = Field(..., description="Number of seconds to wait before proceeding with the next action.")
  
\ No newline at end of file
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+Multi-session HTTP/WebSocket service for the agent.
+
+    python -m src.agent.service --port 8000
+
+    POST   /sessions                 {"task": "...", "url": "https://...", "user_id": "..."}
+    GET    /sessions/{id}            status, pending question and last events
+    POST   /sessions/{id}/resume     {"answer": "..."} answers a human_interaction question
+    DELETE /sessions/{id}            cancels the session
+    WS     /sessions/{id}/events     step events and screenshots, also accepts {"type": "resume", "answer": "..."}
+
+All sessions run as tasks on one event loop and share one browser. A running session leases its own
+tab. A session waiting for an answer, or done, holds no tab and no task: its graph state stays in the
+checkpointer and its tab is re-opened on its last URL when it resumes. Finished sessions are dropped,
+checkpoints included, after `--session-ttl` seconds. Needs fastapi and uvicorn.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from langgraph.types import Command
+from pydantic import BaseModel, Field
+from .agent import agent, build_initial_state, screenshot_archive
+from .frames import frame_store
+from .streaming import cancel_dispatched, node_updates
+from ..browser import initialize_browser, close_browser, get_browser
+from ..utils.logger import agent_info, agent_error
+from ..utils.accounting import export_usage
+from ..utils.loop_monitor import start_loop_monitor, stop_loop_monitor
+
+
+class TaskRequest(BaseModel):
+    task: str = Field(..., description="Goal for the agent")
+    url: Optional[str] = Field(None, description="Page to start from, the blank tab by default")
+    user_id: str = Field("service", description="User the session belongs to")
+    recursion_limit: int = Field(50, description="Graph steps before the session is stopped")
+
+
+class ResumeRequest(BaseModel):
+    answer: str = Field(..., description="Answer to the agent's pending question")
+
+
+class Session:
+    """One agent run and its subscribers. Holds no browser resources between runs."""
+
+    def __init__(self, request: TaskRequest, history_size: int = 100):
+        self.id = str(uuid.uuid4())
+        self.request = request
+        self.status = "pending"
+        self.question = None
+        self.config = {"recursion_limit": request.recursion_limit, "configurable": {"thread_id": self.id}}
+        # Recent events without screenshots, replayed to clients that connect late
+        self.history = deque(maxlen=history_size)
+        self.subscribers: set[asyncio.Queue] = set()
+        self.run: Optional[asyncio.Task] = None
+        self.finished_at: Optional[float] = None
+
+    def publish(self, event: dict):
+        event = {"session_id": self.id, "time": time.time(), **event}
+        self.history.append({key: value for key, value in event.items() if key != "screenshot"})
+        for queue in self.subscribers:
+            # Slow clients lose their oldest events instead of holding up the session
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def info(self) -> dict:
+        return {"session_id": self.id, "task": self.request.task, "status": self.status, "question": self.question, "events": list(self.history)}
+
+
+def step_events(node: str, update, session_id: str) -> list[dict]:
+    """Client events for one node update: messages, tool calls and new screenshots (base64)."""
+    events = []
+    for item in node_updates(update):
+        for message in item.get("messages", []):
+            event = {"type": "step", "node": node, "message": str(message.content)}
+            if getattr(message, "tool_calls", None):
+                event["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in message.tool_calls]
+            events.append(event)
+        for screenshot in item.get("browser_state", {}).get("screenshots", []):
+            events.append({"type": "screenshot", "node": node, "screenshot": frame_store.b64(session_id, screenshot)})
+    return events
+
+
+class SessionManager:
+    def __init__(self, max_sessions: int = 8, session_ttl: float = 3600.0):
+        """
+        Args:
+            max_sessions: Sessions running at once. Their tabs come from the browser's parallel tab
+                limit, which must leave room for the sub-tasks they fan out
+            session_ttl: Seconds a finished session stays queryable before it is dropped
+        """
+        self.sessions: dict[str, Session] = {}
+        self.session_ttl = session_ttl
+        # Separate from the browser's tab leases, so running sessions can't take the slots their sub-tasks wait for
+        self._slots = asyncio.Semaphore(max_sessions)
+
+    def get(self, session_id: str) -> Session:
+        if session_id not in self.sessions:
+            raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+        return self.sessions[session_id]
+
+    def prune(self):
+        """Drop sessions finished longer than `session_ttl` ago, with their checkpoints."""
+        expired = [session for session in self.sessions.values() if session.finished_at and time.time() - session.finished_at > self.session_ttl]
+        for session in expired:
+            del self.sessions[session.id]
+            agent.checkpointer.delete_thread(session.id)
+
+    def start(self, request: TaskRequest) -> Session:
+        self.prune()
+        session = Session(request)
+        self.sessions[session.id] = session
+        session.run = asyncio.create_task(self._run(session, None), name=f"session-{session.id}")
+        return session
+
+    def resume(self, session: Session, answer: str):
+        if session.status != "interrupted":
+            raise HTTPException(status_code=409, detail=f"Session is {session.status}, not waiting for an answer")
+        session.status, session.question = "resuming", None
+        session.publish({"type": "resumed", "answer": answer})
+        session.run = asyncio.create_task(self._run(session, Command(resume=answer)), name=f"session-{session.id}")
+
+    async def cancel(self, session: Session):
+        if session.run and not session.run.done():
+            session.run.cancel()
+            await asyncio.gather(session.run, return_exceptions=True)
+        # Calls dispatched while the supervisor streamed aren't part of the session task
+        cancel_dispatched(session.id)
+        session.status = "cancelled"
+        session.publish({"type": "status", "status": session.status})
+        await self._finish(session)
+
+    async def _finish(self, session: Session):
+        """Release what a session keeps between steps once it won't run again."""
+        if session.finished_at:
+            return
+        session.finished_at = time.time()
+        await screenshot_archive.finalize(session.id)
+        frame_store.close(session.id)
+
+    async def _run(self, session: Session, command: Optional[Command]):
+        browser = await get_browser()
+        try:
+            # Waits here while `max_sessions` are running, then while the browser's parallel tab limit is reached
+            async with self._slots, browser.lease_page():
+                session.status = "running"
+                session.publish({"type": "status", "status": session.status})
+                if command is None:
+                    if session.request.url:
+                        await browser.navigate(session.request.url)
+                    graph_input = await build_initial_state(browser, task=session.request.task, user_id=session.request.user_id, session_id=session.id)
+                else:
+                    # The tab was given back while waiting, re-open the page the session was on
+                    snapshot = await agent.aget_state(session.config)
+                    url = snapshot.values.get("browser_state", {}).get("url")
+                    if url and url != "about:blank":
+                        await browser.navigate(url)
+                    graph_input = command
+
+                async for update in agent.astream(graph_input, config=session.config, stream_mode="updates"):
+                    for node, node_update in update.items():
+                        if node == "__interrupt__":
+                            session.question = node_update[0].value
+                            continue
+                        for event in step_events(node, node_update, session.id):
+                            session.publish(event)
+
+            if session.question is not None:
+                session.status = "interrupted"
+                session.publish({"type": "interrupt", "question": session.question})
+                return
+            final = await agent.aget_state(session.config)
+            # The exit tool records whether the task was accomplished, a supervisor answering without tools completes it
+            execution_state = final.values["execution_state"]
+            session.status = "failed" if execution_state["status"] == "failed" else "completed"
+            usage = final.values.get("usage", {})
+            export_usage(usage, session.id, task=session.request.task, url=session.request.url)
+            session.publish({"type": "status", "status": session.status, "reason": execution_state.get("exit_reason"), "usage": usage})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            agent_error(f"Session {session.id} failed: {e}")
+            session.status = "failed"
+            session.publish({"type": "status", "status": session.status, "error": str(e)})
+        finally:
+            # A session waiting for an answer runs again on resume, a cancelled one is finished by `cancel`
+            if session.question is None and session.status not in ("running", "resuming"):
+                await self._finish(session)
+
+
+manager = SessionManager()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global manager
+    manager = SessionManager(**app.state.session_options)
+    # Reports callbacks that block every session's loop, with LOOP_MONITOR=1
+    start_loop_monitor()
+    # One browser for every session, each running session leases a tab of it
+    await initialize_browser(**app.state.browser_options)
+    try:
+        yield
+    finally:
+        await asyncio.gather(*(manager.cancel(session) for session in manager.sessions.values()), return_exceptions=True)
+        await screenshot_archive.close()
+        frame_store.close()
+        await close_browser()
+        stop_loop_monitor()
+
+
+app = FastAPI(title="Browser agent", lifespan=lifespan)
+app.state.browser_options = {}
+app.state.session_options = {}
+
+
+@app.post("/sessions")
+async def create_session(request: TaskRequest):
+    session = manager.start(request)
+    agent_info(f"Started session {session.id}: {request.task}")
+    return {"session_id": session.id, "status": session.status}
+
+
+@app.get("/sessions")
+async def list_sessions():
+    return [{"session_id": session.id, "task": session.request.task, "status": session.status} for session in manager.sessions.values()]
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    return manager.get(session_id).info()
+
+
+@app.post("/sessions/{session_id}/resume")
+async def resume_session(session_id: str, request: ResumeRequest):
+    session = manager.get(session_id)
+    manager.resume(session, request.answer)
+    return {"session_id": session.id, "status": session.status}
+
+
+@app.delete("/sessions/{session_id}")
+async def cancel_session(session_id: str):
+    session = manager.get(session_id)
+    await manager.cancel(session)
+    return {"session_id": session.id, "status": session.status}
+
+
+@app.websocket("/sessions/{session_id}/events")
+async def session_events(websocket: WebSocket, session_id: str):
+    session = manager.sessions.get(session_id)
+    if session is None:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    queue = asyncio.Queue(maxsize=64)
+    session.subscribers.add(queue)
+
+    async def receive():
+        # Clients can answer questions on the same socket
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "resume":
+                try:
+                    manager.resume(session, message["answer"])
+                except HTTPException as e:
+                    await websocket.send_json({"type": "error", "error": e.detail})
+
+    receiver = asyncio.create_task(receive())
+    try:
+        for event in list(session.history):
+            await websocket.send_json(event)
+        while not receiver.done():
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            await websocket.send_json(getter.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.subscribers.discard(queue)
+        receiver.cancel()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Multi-session HTTP/WebSocket service for the agent")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--profile", help="Browser launch profile, BROWSER_PROFILE by default")
+    parser.add_argument("--max-sessions", type=int, default=8, help="Sessions running at once, each on its own tab")
+    parser.add_argument("--subtask-tabs", type=int, default=4, help="Tabs kept for the sub-tasks sessions fan out, on top of the session tabs")
+    parser.add_argument("--session-ttl", type=float, default=3600.0, help="Seconds finished sessions are kept")
+    args = parser.parse_args()
+    tabs = args.max_sessions + args.subtask_tabs
+    app.state.session_options = {"max_sessions": args.max_sessions, "session_ttl": args.session_ttl}
+    app.state.browser_options = {"profile": args.profile, "max_parallel_tabs": tabs, "max_tabs": tabs + 1}
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Streaming supervisor responses with early tool dispatch.
+The supervisor's response is streamed, and each browser tool call is started as soon as its
+arguments form complete JSON, while the rest of the response (other calls, rationale text) is
+still arriving. The action router then awaits the already running calls instead of starting them.
+Started calls are registered per graph run (see `dispatch_scope`) until the router has answered
+them, so a router that is interrupted and runs again on resume reuses their results instead of
+repeating the actions.
+"""
+import asyncio
+import inspect
+import json
+from langchain_core.messages import ToolMessage, message_chunk_to_message
+from langgraph.types import Command
+from ..utils.logger import agent_debug
+from ..utils.accounting import accounted
+
+# Browser actions that are safe to start from inside the supervisor node
+EARLY_DISPATCH_TOOLS = {"navigate_to_url", "click", "click_element", "type", "press_keys", "scroll", "go_back", "list_tabs"}
+
+# Started tool calls by graph run and tool call id, claimed by the action router
+_dispatched: dict[str, dict[str, asyncio.Task]] = {}
+
+
+def dispatch_scope(config: dict) -> str:
+    """Registry key of the graph run a node belongs to: its thread, and the parent namespace for sub-agents."""
+    configurable = (config or {}).get("configurable", {})
+    # The last namespace segment is the node's own task, which changes from node to node
+    namespace = configurable.get("checkpoint_ns", "").rpartition("|")[0]
+    return f"{configurable.get('thread_id', '')}|{namespace}"
+
+
+# Runs in its own task, which would otherwise keep counting into the supervisor's collector after it returned
+@accounted
+async def execute_tool_call(tool, call: dict, state: dict):
+    """Invoke a tool for a tool call the way ToolNode would, injecting the graph state and the call id."""
+    args = dict(call["args"])
+    if "state" in inspect.signature(tool.coroutine).parameters:
+        args["state"] = state
+    output = await tool.ainvoke({"type": "tool_call", "name": call["name"], "args": args, "id": call["id"]})
+    if isinstance(output, Command):
+        return output
+    if not isinstance(output, ToolMessage):
+        output = ToolMessage(content=str(output), name=call["name"], tool_call_id=call["id"])
+    return Command(update={"messages": [output]})
+
+
+async def stream_with_early_dispatch(runnable, messages: list, state: dict, tools_by_name: dict, scope: str):
+    """Stream a model response, dispatching browser tool calls as soon as their arguments are complete."""
+    dispatched = _dispatched.setdefault(scope, {})
+    response = None
+    async for chunk in runnable.astream(messages):
+        response = chunk if response is None else response + chunk
+        for call_chunk in response.tool_call_chunks:
+            call_id, name = call_chunk.get("id"), call_chunk.get("name")
+            if not call_id or call_id in dispatched or name not in EARLY_DISPATCH_TOOLS:
+                continue
+            try:
+                # A partial object is not valid JSON until its closing brace arrives
+                args = json.loads(call_chunk.get("args") or "")
+            except ValueError:
+                continue
+            agent_debug(f"Dispatching {name} before the response is complete")
+            call = {"name": name, "args": args, "id": call_id}
+            # Tools see the response streamed so far as the last message, like the router would show them the full one
+            call_state = {**state, "messages": [*state["messages"], message_chunk_to_message(response)]}
+            dispatched[call_id] = asyncio.create_task(execute_tool_call(tools_by_name[name], call, call_state))
+
+    if response is None:
+        raise ValueError("Model stream returned no chunks")
+    # Same message type the non-streaming call returns, with fully parsed tool calls
+    message = message_chunk_to_message(response)
+    # Calls that ended up invalid are never routed, nobody would claim them
+    routed = {call["id"] for call in message.tool_calls}
+    for call_id in [call_id for call_id in dispatched if call_id not in routed]:
+        dispatched.pop(call_id).cancel()
+    return message
+
+
+def claim_dispatched(scope: str, tool_calls: list[dict]) -> dict[str, asyncio.Task]:
+    """The already running tasks for these tool calls. They stay registered until `release_dispatched`."""
+    dispatched = _dispatched.get(scope, {})
+    return {call["id"]: dispatched[call["id"]] for call in tool_calls if call["id"] in dispatched}
+
+
+def release_dispatched(scope: str, call_ids=None):
+    """Drop answered calls from the registry, or with no ids every call of the run, cancelling the unfinished ones."""
+    dispatched = _dispatched.get(scope, {})
+    for call_id in list(dispatched) if call_ids is None else call_ids:
+        task = dispatched.pop(call_id, None)
+        if task and not task.done():
+            task.cancel()
+    if not dispatched:
+        _dispatched.pop(scope, None)
+
+
+def cancel_dispatched(thread_id: str):
+    """Cancel the calls of every run on a thread, sub-agents included, e.g. when its session is cancelled."""
+    for scope in [scope for scope in _dispatched if scope.split("|", 1)[0] == thread_id]:
+        release_dispatched(scope)
+
+
+async def await_dispatched(scope: str, dispatched: dict[str, asyncio.Task]) -> list:
+    """Results of claimed calls, cancelling the run's calls if awaiting them is cancelled or fails."""
+    try:
+        return list(await asyncio.gather(*dispatched.values()))
+    except BaseException:
+        release_dispatched(scope)
+        raise
+
+
+def node_updates(update) -> list[dict]:
+    """State updates of one streamed node update, which is a dict, a Command, or a list of them (Send fan-out, usage)."""
+    updates = []
+    for item in update if isinstance(update, list) else [update]:
+        if isinstance(item, Command):
+            item = item.update
+        if isinstance(item, dict):
+            updates.append(item)
+    return updates
@@ -1,121 +1,115 @@
 import base64
-from langchain_core.tools import tool
+from langchain_core.tools import tool, InjectedToolCallId
+from langchain_core.messages import ToolMessage
 from typing import List, Dict, Any
 from google.genai import types
 from langgraph.prebuilt import InjectedState
-from .utils import correct_coordinates
+from .grounding import grounding, frame_key
+from .utils import get_pointer_pause
+from ..utils.logger import agent_debug
 from ..browser import get_browser
+from ..browser.schema import BrowserActionResult
 from .schema import *
-from langgraph.types import interrupt
+from langgraph.types import interrupt, Command
 import asyncio
 from google import genai
 import os
 
+def action_update(result, tool_call_id: str, done: str, failed: str, **browser_state) -> Command:
+    """State update for a browser action, merged by the state reducers instead of mutating the injected state."""
+    if result.success:
+        execution_state = {"history": [done], "failed": False}
+    else:
+        execution_state = {"errors": [f"{failed}. Error: {result.message}"], "failed": True}
+    update = {
+        "execution_state": execution_state,
+        "messages": [ToolMessage(content=result.message, tool_call_id=tool_call_id)],
+    }
+    if browser_state and result.success:
+        update["browser_state"] = browser_state
+    return Command(update=update)
+
+
 @tool(
     "navigate_to_url", 
-    description="Use this tool to navigate to a specific website URL."
+    description="Use this tool to navigate to a specific website URL. Give prefetch with the URLs you expect to open next on that site (e.g. a search results or login page) to load them faster."
 )
-async def navigate_to_url(url: str, state: Annotated[dict, InjectedState]) -> str:
+async def navigate_to_url(url: str, tool_call_id: Annotated[str, InjectedToolCallId], prefetch: Optional[list[str]] = None) -> Command:
     browser = await get_browser()
-    result = await browser.navigate(url)
-    
-    if not result.success:
-        state['execution_state']['consecutive_failures'] += 1
-        state['execution_state']['errors'].append(f"Failed to navigate to {url}. Error: {result.message}")
-    else :
-        state['execution_state']['history'].append(f"Navigated to {url}")
-        state['browser_state']['url'] = url
-        # state['browser_state']['dom_structure'] = await browser.get_dom_structure()
-    return result.message
+    async with browser.actions.mutating():
+        result = await browser.navigate(url, prefetch=prefetch)
+    # A slow page may be reported partially loaded, at the URL it committed to
+    return action_update(result, tool_call_id, f"Navigated to {url}", f"Failed to navigate to {url}", url=(result.data or {}).get("url", url))
 
 
 @tool(
     "click",
     description="Use this tool to click on an element on the browser page by providing its label. "
 )
-async def click(label: str, description: str, state: Annotated[dict, InjectedState]) -> str:
+async def click(label: str, description: str, state: Annotated[dict, InjectedState], tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    browser = await get_browser()
+    # Grounding is part of the serialized action, so calls keep their order and see the page they were issued on
+    async with browser.actions.mutating():
+        return await _ground_and_click(browser, label, description, state, tool_call_id)
+
+
+async def _ground_and_click(browser, label: str, description: str, state: dict, tool_call_id: str) -> Command:
     
-    screenshot = state["browser_state"]["screenshots"][-1]  
+    # Ground every label clicked in this message at once, later clicks on the same frame hit the cache
+    # (with early dispatch, the response streamed so far, whose last call may still be partial)
+    message = state["messages"][-1]
+    targets = [(call["args"]["label"], call["args"].get("description", "")) for call in getattr(message, "tool_calls", []) if call["name"] == "click" and call["args"].get("label")]
+    if (label, description) not in targets:
+        targets.append((label, description))
     
-    image_part = genai.types.Part(
-        inline_data=genai.types.Blob(
-            mime_type="image/png",
-            data=screenshot
-        )
-    )
-    # First handle the label using the locator() function, then only use the genai API.
-    response = genai.Client(api_key=os.getenv("GENAI_API_KEY")).models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[image_part, f"Bounding box for label: '{label}' with description '{description}'. It should be in the format: [ymin, xmin, ymax, xmax] normalized to 0-1000."],
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            system_instruction="""
-            You are a helpful assistant, expert in computer vision and spatial understanding.
-            You will be provided with a screenshot of a web page and a label describing a clickable element on that page like button, dropdown, clickable text, etc.
-            Your task is to identify and return a most appropriate bounding box coordinates of the clickable element on the browser matching the label in the screenshot.
-            
-            **Follow these guidelines:**
-            1. Elements can be a button, link, input field, or any other clickable element.
-            2. Generate correct bounding box coordinates for the element.
-            3. If multiple elements match the description, return the most appropriate one.
-            
-            The bounding box coordinates should be in the format: [ymin, xmin, ymax, xmax].
-            The coordinates should be normalized to 0-1000 scale.
-            """
-        )
-    )
-    
-    import json
-    bounding_box = json.loads(response.text)
+    # Text-only steps keep the last screenshot, so the step count tells their frames apart
+    frame = frame_key(f"{state['session_id']}:{len(state['execution_state'].get('steps', []))}:{state['browser_state']['screenshots'][-1]}")
+    points = await grounding.locate(browser, frame, targets)
+    point = points[(label, description)]
+    agent_debug(f"Grounded '{label}' at {point}")
     
-    print(f"INSIDE THE CLICK_ELEMENT Bounding box for {label}: {bounding_box}")
+    if point is None:
+        result = BrowserActionResult.create_failure(
+            action_type="click",
+            message="Failed because the LLM didn't find the coordinates of the label, Try to give the label with detail description",
+        )
+        return action_update(result, tool_call_id, f"Clicked on {label}", f"Failed to click on {label}")
     
-    y1 = int(bounding_box[0])
-    x1 = int(bounding_box[1])
-    y2 = int(bounding_box[2])
-    x2 = int(bounding_box[3])
+    x, y = point
     
-    if y1 == 0 and x1 == 0 and y2 == 0 and x2 == 0:
-        return f"Failed because the LLM didn't find the coordinates of the label, Try to give the label with detail description"
+    # Only worth the wait when someone watches the browser, the action lock is held meanwhile
+    pause = get_pointer_pause()
+    if pause and not browser.headless:
+        await browser.show_pointer_pro(x=x, y=y)
+        await browser.page.wait_for_timeout(pause)
+        await browser.hide_pointer()
+
+    result = await browser.click_coordinates(x=x, y=y, label=label)
     
-    x =  (x1 + x2) / 2
-    y = (y1 + y2) / 2
-
-    x,y = correct_coordinates(x,y)
+    return action_update(result, tool_call_id, f"Clicked on {label}", f"Failed to click on {label}")
+     
     
+@tool(
+    "click_element",
+    description="Use this tool to click on a marked element by its number from the element table."
+)
+async def click_element(element_id: int, tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
     browser = await get_browser()
-    
-    await browser.show_pointer_pro(x=x, y=y)
-    await browser.page.wait_for_timeout(10000)
-    await browser.hide_pointer()
-
-    result = await browser.click(x=x, y=y, label=label)
-    
-    if not result.success:
-        state['execution_state']['consecutive_failures'] += 1
-        state['execution_state']['errors'].append(f"Failed to click on {label}. Error: {result.message}")
-    else:
-        state['execution_state']['history'].append(f"Clicked on {label}")
-        
-    return result.message
+    async with browser.actions.mutating():
+        result = await browser.click_element(element_id)
+    return action_update(result, tool_call_id, f"Clicked on element {element_id}", f"Failed to click on element {element_id}")
      
     
 @tool(
     "type",
     description="use this tool to type text in the input field."
 )
-async def type(text: str, label: str, state: Annotated[dict, InjectedState]) -> str:
+async def type(text: str, label: str, tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
     
     browser = await get_browser()
-    result = await browser.type(text=text, label=label)
-    
-    if not result.success:
-        state['execution_state']['consecutive_failures'] += 1
-        state['execution_state']['errors'].append(f"Failed to type text in {label}. Error: {result.message}")
-    else:
-        state['execution_state']['history'].append(f"Typed '{text}' in {label}")
-
-    return result.message
+    async with browser.actions.mutating():
+        result = await browser.type(text=text, label=label)
+    return action_update(result, tool_call_id, f"Typed '{text}' in {label}", f"Failed to type text in {label}")
 
 
 @tool(
@@ -123,33 +117,51 @@ async def type(text: str, label: str, state: Annotated[dict, InjectedState]) ->
     # args_schema=PressKeysSchema, 
     description="Use this tool to press keys on the keyboard e.g( 'Enter', 'Backspace' etc."
 )
-async def press_keys(keys: list[str], state: Annotated[dict, InjectedState]) -> str:
+async def press_keys(keys: list[str], tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    browser = await get_browser()
+    async with browser.actions.mutating():
+        result = await browser.press_keys(keys=keys)
+    return action_update(result, tool_call_id, f"Pressed keys {keys}", f"Failed to press keys {keys}")
+
+
+@tool(
+    "scroll",
+    description="Use this tool to scroll the page. Give until_text to keep scrolling until that text or element is visible, in a single step."
+)
+async def scroll(direction: Literal["down", "up"], tool_call_id: Annotated[str, InjectedToolCallId], until_text: Optional[str] = None) -> Command:
     browser = await get_browser()
-    result = await browser.press_keys(keys=keys)
+    async with browser.actions.mutating():
+        if until_text:
+            result = await browser.scroll_until(text=until_text, direction=direction)
+        else:
+            result = await browser.scroll_until(direction=direction, max_scrolls=1)
     
-    if not result.success:
-        state['execution_state']['consecutive_failures'] += 1
-        state['execution_state']['errors'].append(f"Failed to press keys {keys}. Error: {result.message}")
-    else: 
-        state['execution_state']['history'].append(f"Pressed keys {keys}")
-    return result.message
+    done = f"Scrolled {direction}" + (f" to '{until_text}'" if until_text else "")
+    return action_update(result, tool_call_id, done, f"Failed to scroll {direction}")
 
 
 @tool(
     "go_back", 
     description="Use this tool to go back to the previous page in the browser history."
 )
-async def go_back(state: Annotated[dict, InjectedState]) -> str:
+async def go_back(tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
     browser = await get_browser()
-    result = await browser.go_back()
+    async with browser.actions.mutating():
+        result = await browser.go_back()
+    return action_update(result, tool_call_id, "Went back to the previous page.", "Failed to go back")
 
-    if not result.success:
-        state['execution_state']['consecutive_failures'] += 1
-        state['execution_state']['errors'].append(f"Failed to go back. Error: {result.message}")
-    else:
-        state['execution_state']['history'].append("Went back to the previous page.")
 
-    return result.message
+@tool(
+    "list_tabs",
+    description="Use this tool to list the open browser tabs with their titles and URLs."
+)
+async def list_tabs() -> str:
+    browser = await get_browser()
+    async with browser.actions.read_only():
+        tabs_info = await browser.get_all_tabs_info()
+    return "\n".join(
+        f"[{tab['index']}]{' (current)' if tab['is_current'] else ''} {tab['title']} - {tab['url']}" for tab in tabs_info
+    )
 
 
 @tool(
@@ -170,22 +182,41 @@ async def human_interaction(query: str):
 async def wait(seconds: int):
     await asyncio.sleep(seconds)
 
+@tool(
+    "fan_out",
+    args_schema=FanOutSchema,
+    description="Use this tool to run several independent sub-tasks in parallel, each in its own browser tab, and get all their results back at once."
+)
+async def fan_out(subtasks: list[str], state: Annotated[dict, InjectedState]) -> str:
+    # The graph routes valid fan_out calls to the parallel workers, this only answers the others
+    if state['execution_state'].get('parent_task'):
+        return "Fan-out is not available inside a sub-task, complete it step by step."
+    if not subtasks:
+        return "Fan-out needs at least one sub-task."
+    return "Fan-out must be the only tool call of a step, call it again on its own to run the sub-tasks."
+
 @tool(
     "exit",
-    description="use this tool to exit the agent."
+    description="use this tool to exit the agent, with `success` telling whether the task was accomplished."
 )
-async def exit(reason: str, state: Annotated[dict, InjectedState]) -> str:
-    state['execution_state']['status'] = "failed"
-    return f"Agent exited: {reason}"
+async def exit(reason: str, success: bool, tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    return Command(update={
+        "execution_state": {"status": ExecutionStatus.COMPLETED if success else ExecutionStatus.FAILED, "exit_reason": reason},
+        "messages": [ToolMessage(content=f"Agent exited: {reason}", tool_call_id=tool_call_id)],
+    })
 
 
 tools = [
     navigate_to_url,
     click,
+    click_element,
     type,
     press_keys,
+    scroll,
     go_back,
+    list_tabs,
     human_interaction,
     wait,
+    fan_out,
     exit
 ]
\ No newline at end of file
@@ -1,14 +1,18 @@
 import os
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
+from .offline import get_offline_model
 
-def get_model():
-    """Initialize and return the chat model based on environment variables."""
+def get_model(model_name=None):
+    """Initialize and return the chat model based on environment variables, or the named model of the same provider."""
     load_dotenv()
     try:
         model_provider = os.getenv("MODEL_PROVIDER")
-        model_name = os.getenv("MODEL_NAME")
+        model_name = model_name or os.getenv("MODEL_NAME")
         
+        # Scripted stand-in without network access, see offline.py
+        if model_provider == "offline":
+            return get_offline_model()
         if model_provider and model_name:
             return init_chat_model(f"{model_provider}:{model_name}")
         else:
@@ -20,6 +24,31 @@ def get_model():
         traceback.print_exc()
         raise
     
+
+
+def get_observation_mode():
+    """Observation sent to the supervisor: 'screenshot' (default) or 'marks' for a set-of-marks screenshot with an element table."""
+    load_dotenv()
+    return os.getenv("OBSERVATION_MODE", "screenshot")
+
+
+def get_adaptive_observation():
+    """Whether steps that leave the page in place are observed as a thumbnail or as text only instead of a full screenshot."""
+    load_dotenv()
+    return os.getenv("ADAPTIVE_OBSERVATION", "0") in ("1", "true")
+
+
+def get_pointer_pause():
+    """Milliseconds the pointer is shown before a click in headful browsers, 0 to skip it."""
+    load_dotenv()
+    return int(os.getenv("POINTER_PAUSE_MS", "300"))
+
+
+def get_supervisor_streaming():
+    """Whether the supervisor streams its response and starts browser actions before the response is complete."""
+    load_dotenv()
+    return os.getenv("SUPERVISOR_STREAMING", "0") in ("1", "true")
+    
     
 SYSTEM_MESSAGE = """
 You are a browser automation assistant that helps users complete tasks on websites.
@@ -44,20 +73,32 @@ TOOLS YOU CAN USE:
 4. press_keys(keys: list[str]): Press keyboard keys like Enter, Backspace, Tab, etc.
    Example: After typing in a search box, use press_keys with ["Enter"] to submit the search.
 
-5. go_back(): Go back to the previous page, like using the back button in a browser.
+5. scroll(direction: str, until_text: str): Scroll the page, including scrollable panels like chat lists. Give until_text to keep scrolling until that text is visible, all in one step.
+   Example: To find the "Reviews" section further down, use scroll with direction="down" and until_text="Reviews".
+
+6. go_back(): Go back to the previous page, like using the back button in a browser.
    Example: If you need to return to the previous page, use go_back.
 
-6. human_interaction(query: str): Ask the user for help when you need information or encounter a problem.
+7. human_interaction(query: str): Ask the user for help when you need information or encounter a problem.
    Example: If you need login credentials, use human_interaction with "I need your username and password to log in to this site."
 
-7. wait(seconds: int): Wait for a specified number of seconds before continuing.
+8. wait(seconds: int): Wait for a specified number of seconds before continuing.
    Example: Use wait with 3 seconds when a page is loading or if specifically asked by the user.
 
-8. exit(reason: str): If got stuck in loops or task has been completed or failed then stop the agent gracefully, providing a reason for exiting.
+9. exit(reason: str, success: bool): If got stuck in loops or task has been completed or failed then stop the agent gracefully, providing a reason for exiting and whether the task was accomplished.
+
+10. click_element(element_id: int): Click an element by its number when the screenshot has numbered marks and an element table is provided.
+   Example: To click the element marked [12] 'Submit', use click_element with 12. Prefer this over click whenever the element is listed.
+
+11. fan_out(subtasks: list[str]): Run independent sub-tasks in parallel, each in its own tab, and receive all their results together.
+   Example: To compare a product's price on three shops, use fan_out with one self-contained sub-task per shop.
+
+12. list_tabs(): List the open tabs with their titles and URLs.
 
 IMPORTANT RULES:
 - After typing text in a search box, you must press Enter to submit the search
 - Only use wait when a page is still loading, handling a CAPTCHA, or when the user asks you to wait
+- Use fan_out only when the sub-tasks don't depend on each other; each sub-task must make sense on its own
 - Use human_interaction only for sensitive information (like passwords) or when you're stuck
 - Always select the most specific and relevant action to make progress toward the user's goal
 - If you're unsure what to do next, look for clues in the screenshot like buttons, forms, or navigation elements
@@ -65,15 +106,3 @@ IMPORTANT RULES:
 Use simple actions, one step at a time, to help the user complete their task.
 """
 
-
-def correct_coordinates(x, y, viewport_width=1280, viewport_height=800):
-    
-    model_coord_range = 1000.0
-
-    x_scale_factor = viewport_width / model_coord_range
-    y_scale_factor = viewport_height / model_coord_range
-
-    x_original = x * x_scale_factor
-    y_original = y * y_scale_factor
-
-    return x_original, y_original
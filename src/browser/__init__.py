@@ -1,27 +1,61 @@
 """
 Module for managing the global browser instance.
 This allows sharing a single browser instance across different parts of the application.
+Playwright is imported on first use, so the pure helpers (coordinates, dom diffs, ...) import without it.
 """
-from typing import Optional
-from .browser import Browser
+import importlib
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .browser import Browser
+    from .watchdog import WatchdogConfig
+    from .storage import StorageStateCache
+    from .profiles import LaunchProfile, PROFILES
+
+# Re-exported names and the submodules they live in
+_EXPORTS = {
+    "Browser": ".browser",
+    "WatchdogConfig": ".watchdog",
+    "StorageStateCache": ".storage",
+    "LaunchProfile": ".profiles",
+    "PROFILES": ".profiles",
+}
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
 
 # Global browser instance
-_browser_instance: Optional[Browser] = None
+_browser_instance: Optional["Browser"] = None
 
-async def initialize_browser(use_debug_chrome: bool = False
-) -> Browser:
+async def initialize_browser(*, use_debug_chrome: bool = False,
+    watchdog: Optional["WatchdogConfig"] = None,
+    storage_cache: Optional["StorageStateCache"] = None,
+    identity: str = "default",
+    warm_sites: Optional[list[str]] = None,
+    **browser_options
+) -> "Browser":
     
     global _browser_instance
     if _browser_instance is None:
-        _browser_instance = Browser(use_debug_chrome=use_debug_chrome)
+        from .browser import Browser
+        _browser_instance = Browser(
+            use_debug_chrome=use_debug_chrome,
+            watchdog=watchdog,
+            storage_cache=storage_cache,
+            identity=identity,
+            warm_sites=warm_sites,
+            **browser_options,
+        )
         await _browser_instance.initialize()
     return _browser_instance
 
-async def get_browser(viewport_width=1280, viewport_height=800) -> Browser:
+async def get_browser() -> "Browser":
     
     global _browser_instance
     if _browser_instance is None:
-        await initialize_browser(viewport_width, viewport_height)
+        await initialize_browser()
     return _browser_instance
 
 async def close_browser():
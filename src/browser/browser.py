@@ -1,37 +1,114 @@
 # filepath: c:\Users\aryav\projects\orbitagent\browser_use_agent\services\browser.py
-from playwright.async_api import async_playwright, Page, Browser, Playwright
+from playwright.async_api import async_playwright, Page, Browser, Playwright, TimeoutError as PlaywrightTimeoutError
 from google.genai import types
+import asyncio
+import base64
 import io
-from typing import Optional, Any
+import os
+from contextlib import asynccontextmanager
+from typing import Optional, Any, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 from .schema import BrowserActionResult
+from .tabs import TabTracker, PageLease, current_lease
+from .watchdog import BrowserWatchdog, WatchdogConfig
+from .storage import StorageStateCache
+from .profiles import LaunchProfile, SharedChromium, get_launch_profile, free_port, COMMON_ARGS
+from .marks import INTERACTIVE_SELECTOR
+from .dom import DomSnapshotter
+from .runtime import PAGE_RUNTIME_JS, call_runtime
+from .executor import ActionExecutor
+from .coordinates import FrameGeometry, image_size
 from ..utils.logger import browser_info, browser_error
+from ..utils.accounting import timed, count
 class Browser:
-    def __init__(self, use_debug_chrome: bool = False):
+    def __init__(self, use_debug_chrome: bool = False, max_tabs: int = 8, tab_idle_timeout: float = 300.0, max_parallel_tabs: int = 4, navigation_wait_until: str = "domcontentloaded", navigation_budget: int = 15000, record_har_path: Optional[str] = None, replay_har_path: Optional[str] = None, watchdog: Optional[WatchdogConfig] = None, storage_cache: Optional[StorageStateCache] = None, identity: str = "default", warm_sites: Optional[list[str]] = None, profile: Union[str, LaunchProfile, None] = None, chrome_path: Optional[str] = None):
         self.viewport_width = 1280
         self.viewport_height = 800
         self.auto_switch_to_new_tabs = True 
-        self.all_pages = [] 
+        # Navigation returns at this load state plus a readiness check, within a total budget in ms
+        self.navigation_wait_until = navigation_wait_until
+        self.navigation_budget = navigation_budget
+        self.tabs = TabTracker(max_tabs=max_tabs, idle_timeout=tab_idle_timeout)
         self.use_debug_chrome = use_debug_chrome
-        self.chrome_path = "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe" if use_debug_chrome else None
-        self.debug_port = 9222 
+        # Headless flag, Chromium flags, debugging port and process sharing, see profiles.py
+        self.profile = profile if isinstance(profile, LaunchProfile) else get_launch_profile(profile)
+        self.chrome_path = chrome_path or os.getenv("CHROME_PATH") or None
+        self.debug_port = None  # picked at launch
         self.user_data_dir = "./chrome-user-data" if use_debug_chrome else None
         
-        self.headless = False
+        self.headless = self.profile.headless
+        # Key of the shared Chromium process this browser's context lives in, if any
+        self._shared_key = None
+        # Network capture for recorded sessions, and the HAR served instead of the network on replay
+        self.record_har_path = record_har_path
+        self.replay_har_path = replay_har_path
+        self._har_segment = 0
+        # Storage state (cookies, localStorage) applied to new sandboxed contexts
+        self.storage_state = None
+        self.storage_cache = storage_cache
+        self.identity = identity
+        self.warm_sites = warm_sites or []
+        self.watchdog = BrowserWatchdog(self, watchdog) if watchdog else None
+        self._page = None
+        # Interactive elements of the last marked screenshot, by element id
+        self._element_index: dict[int, dict] = {}
+        self._dom = DomSnapshotter()
+        self._actions = ActionExecutor()
+        # Tabs leased to concurrent sub-tasks, see `lease_page`
+        self._lease_slots = asyncio.Semaphore(max_parallel_tabs)
+        self._leases: dict[Page, PageLease] = {}
+        self._pending_leases = 0
+        # Notified when a pending lease has its tab, see `_on_new_page`
+        self._lease_changed = asyncio.Condition()
+        # Set while a main tab click waits for the popup it may open, see `click_coordinates`
+        self._popup_waiter: Optional[asyncio.Future] = None
+    
+    # Inside a `lease_page` block the page and its observation state resolve to the leased tab
+    @property
+    def page(self):
+        lease = current_lease.get()
+        return lease.page if lease else self._page
+
+    @page.setter
+    def page(self, page):
+        lease = current_lease.get()
+        if lease:
+            lease.page = page
+        else:
+            self._page = page
+
+    @property
+    def element_index(self) -> dict[int, dict]:
+        lease = current_lease.get()
+        return lease.element_index if lease else self._element_index
+
+    @element_index.setter
+    def element_index(self, element_index: dict[int, dict]):
+        lease = current_lease.get()
+        if lease:
+            lease.element_index = element_index
+        else:
+            self._element_index = element_index
+
+    @property
+    def dom(self) -> DomSnapshotter:
+        lease = current_lease.get()
+        return lease.dom if lease else self._dom
+
+    @property
+    def actions(self) -> ActionExecutor:
+        """Serializes the page-mutating actions of the session driving this page."""
+        lease = current_lease.get()
+        return lease.actions if lease else self._actions
     
     async def initialize(self):
         try:
-            self.playwright = await async_playwright().start()
-            
-            # Common browser arguments for both modes
-            browser_args = [
-                "--disable-extensions", 
-                "--disable-file-system", 
-                "--start-maximized",
-            ]
+            # Common browser arguments for both modes, plus the profile's
+            browser_args = COMMON_ARGS + self.profile.args
             
-            # Add debug port if specified
+            # A free port per instance, unless the profile pins one
+            self.debug_port = free_port() if self.profile.debug_port == 0 else self.profile.debug_port
             if self.debug_port:
                 browser_args.append(f"--remote-debugging-port={self.debug_port}")
             
@@ -46,26 +123,39 @@ class Browser:
                 
             common_options["args"] = browser_args
             
+            # Options of the browsing context itself, for both modes
+            context_options = self._context_options()
+            
             # Initialize browser based on chosen mode
             if self.use_debug_chrome:
+                self.playwright = await async_playwright().start()
                 self.context = await self.playwright.chromium.launch_persistent_context(
                     user_data_dir=self.user_data_dir,
-                    **common_options
+                    **common_options,
+                    **context_options
                 )
                 
                 self.browser = self.context
             else:
                 # Launch standard sandboxed browser
                 browser_info(f"Launching sandboxed browser")
+                # Start already logged in on the warm sites when cached snapshots exist
+                if self.storage_state is None and self.storage_cache and self.warm_sites:
+                    self.storage_state = self.storage_cache.load(self.warm_sites, self.identity)
                 # In sandbox mode, we have a browser object that creates contexts
-                self.browser = await self.playwright.chromium.launch(**common_options)
-                self.context = await self.browser.new_context(no_viewport=True)  # No initial viewport in sandbox mode
-            
-            self.page = await self.context.new_page()
+                if self.profile.shared_process:
+                    # Every sandboxed browser of the profile gets a context in the same process
+                    self._shared_key = (self.profile.name, self.chrome_path)
+                    self.playwright, self.browser = await SharedChromium.acquire(self._shared_key, common_options)
+                else:
+                    self.playwright = await async_playwright().start()
+                    self.browser = await self.playwright.chromium.launch(**common_options)
+                self.context = await self.browser.new_context(no_viewport=True, storage_state=self.storage_state, **context_options)  # No initial viewport in sandbox mode
             
-            # Initialize page tracking
-            self.all_pages = list(self.context.pages)
-            browser_info(f"Browser initialized with viewport")
+            await self._attach_context()
+            if self.watchdog:
+                self.watchdog.start()
+            browser_info(f"Browser initialized with the {self.profile.name} profile" + (f", debugging port {self.debug_port}" if self.debug_port else ""))
             return True
         except Exception as e:
             browser_error(f"Error initializing browser: {e}")
@@ -74,51 +164,187 @@ class Browser:
             if hasattr(self, 'context') and self.context:
                 await self.context.close()
                 
-            # Close browser if it's different from context
-            if hasattr(self, 'browser') and self.browser and hasattr(self, 'context') and self.browser != self.context:
-                await self.browser.close()
-                
-            # Always stop playwright
-            if hasattr(self, 'playwright') and self.playwright:
-                await self.playwright.stop()
+            await self._release_process()
                 
             return False
                 
-    async def navigate(self, url: str) -> BrowserActionResult:
+    def _context_options(self) -> dict:
+        """Options of a new browsing context. Each recycled context records its HAR next to the first, numbered."""
+        if not self.record_har_path:
+            return {}
+        path = self.record_har_path
+        if self._har_segment:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{self._har_segment}{ext}"
+        self._har_segment += 1
+        return {"record_har_path": path}
+
+    async def _attach_context(self):
+        """Open the working page on the current context and start tracking its tabs."""
+        self.tabs = TabTracker(max_tabs=self.tabs.max_tabs, idle_timeout=self.tabs.idle_timeout)
+        self.dom.reset()
+        await self.context.add_init_script(PAGE_RUNTIME_JS)
+        if self.replay_har_path:
+            # Replays never touch the network, unrecorded requests are aborted
+            await self.context.route_from_har(self.replay_har_path, not_found="abort")
+        self.page = await self.context.new_page()
+        
+        # Track tabs from the context's page events instead of polling the page count
+        for page in self.context.pages:
+            self._track_page(page)
+        self.tabs.touch(self.page)
+        self.context.on("page", self._on_new_page)
+
+    @timed
+    async def recycle(self, restart_process: bool = False) -> BrowserActionResult:
+        """
+        Replace the browser context, or the whole Chromium process, with a fresh one.
+        The current URL and storage state are carried over so callers keep working on the same `Browser`.
+        """
+        url = self.page.url if getattr(self, 'page', None) else None
+        try:
+            self.storage_state = await self.context.storage_state()
+        except Exception as e:
+            # A crashed context can't report its state, fall back to the last snapshot
+            browser_error(f"Error capturing storage state, using last snapshot: {e}")
+            if self.watchdog and self.watchdog.last_storage_state:
+                self.storage_state = self.watchdog.last_storage_state
+        
         try:
-            # Store page count before navigation
-            initial_pages = len(self.context.pages)
+            # The persistent profile lives in one process, so it can only be recycled as a whole.
+            # A shared process is only restarted once its last user releases it, or when it died.
+            if restart_process or self.use_debug_chrome:
+                await self.close()
+                if not await self.initialize():
+                    raise Exception("Browser failed to initialize")
+            else:
+                try:
+                    await self.context.close()
+                except Exception as e:
+                    browser_error(f"Error closing context: {e}")
+                self.context = await self.browser.new_context(no_viewport=True, storage_state=self.storage_state, **self._context_options())
+                await self._attach_context()
             
-            await self.page.goto(url, wait_until='load', timeout=60000) # Wait for load, reasonable timeout
+            if url and url != "about:blank":
+                await self.page.goto(url, wait_until='domcontentloaded', timeout=60000)
             
-            # Check if navigation created new tabs (redirects, popups, etc.)
-            if len(self.context.pages) > initial_pages:
-                await self._switch_to_newest_tab()
+            browser_info(f"Browser {'process' if restart_process else 'context'} recycled, restored {url}")
+            return BrowserActionResult.create_success(
+                action_type="recycle",
+                message=f"Browser recycled and restored {url}",
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="recycle",
+                message=f"Error recycling browser: {str(e)}",
+            )
                 
+    async def save_storage_state(self, sites: Optional[list[str]] = None) -> BrowserActionResult:
+        """Snapshot the storage state of `sites` (defaults to the warm sites) into the storage cache."""
+        sites = sites or self.warm_sites
+        try:
+            if not self.storage_cache:
+                raise ValueError("No storage cache configured")
+            for site in sites:
+                await self.storage_cache.save(self.context, site, self.identity)
+            return BrowserActionResult.create_success(
+                action_type="save_storage_state",
+                message=f"Saved storage state for {', '.join(sites)}",
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="save_storage_state",
+                message=f"Error saving storage state: {str(e)}",
+            )
+                
+    @timed
+    async def navigate(self, url: str, wait_until: str = None, budget: int = None, prefetch: Optional[list[str]] = None) -> BrowserActionResult:
+        """
+        Navigate and return as soon as the page is usable instead of waiting for every subresource.
+        Waits for `wait_until` ('commit' or 'domcontentloaded'), then for the full load with what is left of
+        `budget`. Running out of budget once the navigation committed, also before `wait_until`, is reported
+        as a partial load, only a navigation that never committed fails.
+        """
+        wait_until = wait_until or self.navigation_wait_until
+        budget = budget or self.navigation_budget
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget / 1000
+        page = self.page
+        # Main frame commits of this navigation, a slow site has committed long before its DOMContentLoaded
+        committed = []
+        on_navigated = lambda frame: committed.append(frame.url) if frame == page.main_frame else None
+        try:
+            self.tabs.touch(page)
+            page.on("framenavigated", on_navigated)
+            try:
+                await page.goto(url, wait_until=wait_until, timeout=budget)
+                reached = True
+            except PlaywrightTimeoutError:
+                if not committed:
+                    raise
+                reached = False
+            finally:
+                page.remove_listener("framenavigated", on_navigated)
+            
+            # Readiness check: the full load if it fits in the budget, otherwise report what we have
+            load_state = wait_until if reached else "commit"
+            remaining = int((deadline - loop.time()) * 1000)
+            try:
+                if remaining <= 0:
+                    raise TimeoutError()
+                await page.wait_for_load_state("load", timeout=remaining)
+                load_state = "load"
+            except Exception:
+                try:
+                    load_state = (await call_runtime(page, "readiness"))["readyState"]
+                except Exception:
+                    # e.g. the context was destroyed by a redirect, the navigation itself succeeded
+                    pass
+            
+            # Popups opened by the navigation are picked up by the `page` event handler
+            await self._close_stale_tabs()
+            if prefetch:
+                await self.prefetch(prefetch)
+            
+            message = f"Navigated to {page.url}"
+            if load_state != "load":
+                message += f" (page still loading, ready state '{load_state}' after {budget}ms)"
             return BrowserActionResult.create_success(
                 action_type="navigate",
-                message=f"Navigated to {url}",
+                message=message,
+                data={"load_state": load_state, "url": page.url}
             )
         except Exception as e:
             return BrowserActionResult.create_failure(
                 action_type="navigate",
                 message=f"Error navigating to {url}: {str(e)}",
             )
+
+    @timed
+    async def prefetch(self, urls: list[str]) -> BrowserActionResult:
+        """Warm the HTTP cache and connections for likely next URLs with prefetch/preconnect hints on the current page."""
+        try:
+            await call_runtime(self.page, "prefetch", urls)
+            return BrowserActionResult.create_success(
+                action_type="prefetch",
+                message=f"Prefetching {len(urls)} URLs",
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="prefetch",
+                message=f"Error prefetching: {str(e)}",
+            )
             
     async def close(self) -> BrowserActionResult:
         try:
+            if self.watchdog:
+                await self.watchdog.stop()
+                
             # Close context first
             if hasattr(self, 'context') and self.context:
                 await self.context.close()
                 
-            # Only close browser separately if it's different from context
-            # (In persistent mode, browser == context)
-            if hasattr(self, 'browser') and self.browser and self.browser != self.context:
-                await self.browser.close()
-                
-            # Always stop playwright
-            if hasattr(self, 'playwright') and self.playwright:
-                await self.playwright.stop()
+            await self._release_process()
                 
             return BrowserActionResult.create_success(
                 action_type="close",
@@ -130,6 +356,22 @@ class Browser:
                 message=f"Error closing browser: {str(e)}",
             )
         
+    async def _release_process(self):
+        """Close the Chromium process and Playwright, or give up this browser's share of a shared process."""
+        if self._shared_key:
+            key, self._shared_key = self._shared_key, None
+            await SharedChromium.release(key)
+            return
+        
+        # Only close browser separately if it's different from context
+        # (In persistent mode, browser == context)
+        if hasattr(self, 'browser') and self.browser and self.browser != getattr(self, 'context', None):
+            await self.browser.close()
+            
+        # Always stop playwright
+        if hasattr(self, 'playwright') and self.playwright:
+            await self.playwright.stop()
+        
     async def screenshot_bytes(self, iteration=None) -> types.Part:
         try:
             screenshot_bytes = await self.page.screenshot()
@@ -137,6 +379,84 @@ class Browser:
         except Exception as e:
             return str(e)
 
+    async def frame_geometry(self, image: bytes, clip: Optional[dict] = None) -> FrameGeometry:
+        """Geometry of a screenshot just taken from the current page, also refreshing the recorded viewport size."""
+        metrics = await call_runtime(self.page, "viewport")
+        self.viewport_width, self.viewport_height = metrics["width"], metrics["height"]
+        
+        region = clip or {"x": 0, "y": 0, "width": metrics["width"], "height": metrics["height"]}
+        size = image_size(image) or (round(region["width"] * metrics["dpr"]), round(region["height"] * metrics["dpr"]))
+        return FrameGeometry(
+            viewport_width=metrics["width"],
+            viewport_height=metrics["height"],
+            device_scale_factor=metrics["dpr"],
+            image_width=size[0],
+            image_height=size[1],
+            region_x=region["x"],
+            region_y=region["y"],
+            region_width=region["width"],
+            region_height=region["height"],
+        )
+
+    @timed
+    async def screenshot_frame(self, clip: Optional[dict] = None, scale: str = "device", quality: Optional[int] = None) -> BrowserActionResult:
+        """
+        Screenshot of the viewport (or a CSS pixel `clip` of it) with the geometry needed to map coordinates back.
+        PNG by default, JPEG with `quality`.
+        """
+        try:
+            image_options = {"type": "jpeg", "quality": quality} if quality else {}
+            screenshot_bytes = await self.page.screenshot(clip=clip, scale=scale, **image_options)
+            count("screenshots")
+            geometry = await self.frame_geometry(screenshot_bytes, clip)
+            return BrowserActionResult.create_success(
+                action_type="screenshot",
+                message="Screenshot captured",
+                data={"screenshot": screenshot_bytes, "geometry": geometry}
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="screenshot",
+                message=f"Error taking screenshot: {str(e)}",
+            )
+
+    @timed
+    async def screenshot_thumbnail(self, max_width: int = 640, quality: int = 60) -> BrowserActionResult:
+        """Viewport screenshot downscaled by Chromium to at most `max_width` pixels, as JPEG, with its geometry."""
+        try:
+            metrics = await call_runtime(self.page, "viewport")
+            scale = min(1.0, max_width / (metrics["width"] * metrics["dpr"]))
+            cdp = await self.context.new_cdp_session(self.page)
+            try:
+                # The clip is in document coordinates, so it follows the scroll position
+                shot = await cdp.send("Page.captureScreenshot", {
+                    "format": "jpeg",
+                    "quality": quality,
+                    "clip": {"x": metrics["scrollX"], "y": metrics["scrollY"], "width": metrics["width"], "height": metrics["height"], "scale": scale},
+                })
+            finally:
+                await cdp.detach()
+            screenshot_bytes = base64.b64decode(shot["data"])
+            count("screenshots")
+            geometry = await self.frame_geometry(screenshot_bytes)
+            return BrowserActionResult.create_success(
+                action_type="screenshot",
+                message="Thumbnail captured",
+                data={"screenshot": screenshot_bytes, "geometry": geometry}
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="screenshot",
+                message=f"Error taking thumbnail: {str(e)}",
+            )
+
+    async def focused_element(self) -> Optional[dict]:
+        """Tag and editability of the focused element, None when it can't be read."""
+        try:
+            return await call_runtime(self.page, "focusedElement")
+        except Exception:
+            return None
+
     async def screenshot_part(self) -> BrowserActionResult:
         try:
             # Take the screenshot
@@ -175,21 +495,87 @@ class Browser:
                 message=f"Error taking screenshot part: {str(e)}",
             )
             
+    @timed
+    async def get_dom_structure(self) -> BrowserActionResult:
+        """Compact text outline of the page, as a diff against the previous call when the page is unchanged."""
+        try:
+            dom, is_full = await self.dom.capture(self.page)
+            return BrowserActionResult.create_success(
+                action_type="dom_snapshot",
+                message=f"{'Full' if is_full else 'Incremental'} DOM snapshot captured",
+                data={"dom": dom, "full": is_full}
+            )
+        except Exception as e:
+            self.dom.reset()
+            return BrowserActionResult.create_failure(
+                action_type="dom_snapshot",
+                message=f"Error capturing DOM snapshot: {str(e)}",
+            )
+
+    @timed
+    async def screenshot_with_marks(self) -> BrowserActionResult:
+        """Screenshot with numbered marks over the visible interactive elements, indexed for `click_element`."""
+        try:
+            elements = await call_runtime(self.page, "indexElements", INTERACTIVE_SELECTOR)
+            await call_runtime(self.page, "drawMarks", elements)
+            try:
+                # CSS scale keeps the image small on high-DPI screens and in the same space as the marks
+                screenshot_bytes = await self.page.screenshot(scale="css")
+                count("screenshots")
+            finally:
+                await call_runtime(self.page, "clearMarks")
+            
+            self.element_index = {el["id"]: el for el in elements}
+            geometry = await self.frame_geometry(screenshot_bytes)
+            return BrowserActionResult.create_success(
+                action_type="screenshot",
+                message=f"Marked screenshot captured with {len(elements)} elements",
+                data={"screenshot": screenshot_bytes, "elements": elements, "geometry": geometry}
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="screenshot",
+                message=f"Error taking marked screenshot: {str(e)}",
+            )
+
+    async def click_element(self, element_id: int) -> BrowserActionResult:
+        """Click the center of an element from the last marked screenshot."""
+        element = self.element_index.get(element_id)
+        if element is None:
+            return BrowserActionResult.create_failure(
+                action_type="click",
+                message=f"Unknown element id {element_id}, take a new observation",
+            )
+        x = element["x"] + element["width"] / 2
+        y = element["y"] + element["height"] / 2
+        return await self.click_coordinates(x=x, y=y, label=f"[{element_id}] {element['text']}")
+            
+    @timed
     async def click_coordinates(self, x: float = 0, y: float = 0, label: str = None, button: str = "left", timeout: int = 5000, delay_after: int = 500) -> BrowserActionResult:
         
         try:
-            # Store page count before click
-            initial_pages = len(self.context.pages)
-            
-            new_tab_opened = False
+            clicked_page = self.page
+            self.tabs.touch(clicked_page)
             
-            await self.page.mouse.click(x, y)
-
-            if len(self.context.pages) > initial_pages:
-                new_tab_opened = await self._switch_to_newest_tab()
+            # The `page` event handler hands a popup of the main tab to this click, which holds the
+            # action slot, so the switch happens before the next observation or action
+            waiter = asyncio.get_running_loop().create_future() if current_lease.get() is None else None
+            self._popup_waiter = waiter
+            try:
+                await self.page.mouse.click(x, y)
+                popup = None
+                if waiter:
+                    try:
+                        popup = await asyncio.wait_for(waiter, timeout=delay_after / 1000)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._popup_waiter = None
             
             success_message = f"Successfully clicked at coordinates ({x},{y}), label: '{label}'"
-            if new_tab_opened:
+            if popup:
+                await self._switch_to_tab(popup)
+                await self._close_stale_tabs()
                 success_message += " - New tab opened, switched to it"
                 
             return BrowserActionResult.create_success(
@@ -202,9 +588,14 @@ class Browser:
                 message=f"Error clicking at coordinates ({x},{y}): {str(e)}",
             )
             
+    @timed
     async def scroll(self, direction: str = "down", amount: int = 500, x: float = None, y: float = None, delay_after: int = 500) -> BrowserActionResult:
         
         try:
+            # Wheel events go to whatever is under the mouse, default to the middle of the viewport
+            if x is None or y is None:
+                viewport = self.page.viewport_size or await call_runtime(self.page, "viewport")
+                x, y = viewport["width"] / 2, viewport["height"] / 2
             await self.page.mouse.move(x, y)
             
             scroll_delta_y = amount if direction == "down" else -amount
@@ -221,20 +612,83 @@ class Browser:
                 message=f"Error scrolling {direction}: {str(e)}",
             )
             
+    @timed
+    async def scroll_until(self, text: str = None, selector: str = None, direction: str = "down", container: str = None, step: int = None, max_scrolls: int = 30, load_wait: int = 1500, delay_after: int = 150) -> BrowserActionResult:
+        """
+        Scroll until an element with `text` (or matching `selector`) is visible and centered, or the end is reached.
+        Scrolls the document or the largest nested scroll container (or `container`), and waits once at the end
+        for infinite-scroll content to load. Without a target it scrolls to the end.
+        """
+        target = text or selector
+        try:
+            waited_for_load = False
+            moved = False
+            for scrolls in range(max_scrolls + 1):
+                if target:
+                    found = await call_runtime(self.page, "findTarget", {"text": text, "selector": selector})
+                    if found:
+                        return BrowserActionResult.create_success(
+                            action_type="scroll",
+                            message=f"Found '{target}' after {scrolls} scrolls, it is now in view at ({found['x']:.0f},{found['y']:.0f})",
+                            data=found
+                        )
+                if scrolls == max_scrolls:
+                    break
+                
+                position = await call_runtime(self.page, "scrollStep", {"container": container, "direction": direction, "step": step})
+                if position["after"] != position["before"]:
+                    waited_for_load = False
+                    moved = True
+                    await self.page.wait_for_timeout(delay_after)
+                elif direction == "down" and not waited_for_load:
+                    # Nothing moved, give an infinite feed a chance to append more content
+                    waited_for_load = True
+                    await self.page.wait_for_timeout(load_wait)
+                else:
+                    edge = "end" if direction == "down" else "top"
+                    if target:
+                        return BrowserActionResult.create_failure(
+                            action_type="scroll",
+                            message=f"Reached the {edge} of the page after {scrolls} scrolls without finding '{target}'",
+                        )
+                    if not moved:
+                        return BrowserActionResult.create_failure(
+                            action_type="scroll",
+                            message=f"The page did not move, it is already at the {edge}",
+                        )
+                    return BrowserActionResult.create_success(
+                        action_type="scroll",
+                        message=f"Scrolled {direction} to the {edge} of the page in {scrolls} scrolls",
+                    )
+            
+            if target:
+                return BrowserActionResult.create_failure(
+                    action_type="scroll",
+                    message=f"'{target}' not found after {max_scrolls} scrolls {direction}",
+                )
+            if not moved:
+                # e.g. a single scroll down at the end of a feed that loaded nothing more
+                return BrowserActionResult.create_failure(
+                    action_type="scroll",
+                    message=f"The page did not move when scrolling {direction}",
+                )
+            return BrowserActionResult.create_success(
+                action_type="scroll",
+                message=f"Scrolled {direction} {max_scrolls} times",
+            )
+        except Exception as e:
+            return BrowserActionResult.create_failure(
+                action_type="scroll",
+                message=f"Error scrolling {direction}: {str(e)}",
+            )
+            
+    @timed
     async def type(self, text: str, label: str = None, delay: int = 50, timeout: int = 10000, delay_after: int = 200) -> BrowserActionResult:
         label = label or '[NO LABEL]'
         try:
-            focused = await self.page.evaluate("""
-                () => {
-                  const el = document.activeElement;
-                  return {
-                    tag: el?.tagName,
-                    isContentEditable: el?.isContentEditable
-                  }
-                }
-                """)
-            
-            if not (focused["tag"].upper() in ["INPUT", "TEXTAREA"] or focused["isContentEditable"]):
+            focused = await self.focused_element() or {}
+            
+            if not ((focused.get("tag") or "").upper() in ["INPUT", "TEXTAREA"] or focused.get("isContentEditable")):
                 raise ValueError("No focusable input field selected.")
 
             await self.page.keyboard.type(text, delay=delay)
@@ -249,6 +703,7 @@ class Browser:
                 message=f"Error typing text '{text}': {str(e)}",
             )
             
+    @timed
     async def press_keys(self, keys, delay_after: int = 200) -> BrowserActionResult:
         try:
             pressed_keys = []
@@ -284,6 +739,7 @@ class Browser:
                 message=f"Error pressing keys: {str(e)}",
             )
             
+    @timed
     async def go_back(self, delay_after: int = 1000) -> BrowserActionResult:
         try:
             await self.page.go_back()
@@ -298,69 +754,14 @@ class Browser:
                 message=f"Error navigating back: {str(e)}",
             )
     
+    @timed
     async def show_pointer(self, x: float, y: float):
         try:
 
             await self.page.wait_for_load_state("domcontentloaded")
             
-            js_code = """(coords) => {                // Remove existing pointer if any
-                const existingPointer = document.getElementById('ai-pointer');
-                if (existingPointer) existingPointer.remove();
-                
-                // Create pointer element
-                const pointer = document.createElement('div');
-                pointer.id = 'ai-pointer';                
-                pointer.style.cssText = `
-                    position: fixed;
-                    width: 8px;
-                    height: 8px;
-                    background: rgba(255, 0, 0, 0.7);
-                    border: 3px solid white;
-                    border-radius: 50%;
-                    pointer-events: none;
-                    transform: translate(-50%, -50%);
-                    z-index: 2147483647;
-                    left: ${coords.x}px;
-                    top: ${coords.y}px;
-                    box-shadow: 0 0 15px red;
-                `;
-                
-                // Add CSS animation
-                const style = document.createElement('style');
-                style.textContent = `
-                    @keyframes pulse {
-                        0% { transform: translate(-50%, -50%) scale(1); opacity: 1; }
-                        50% { transform: translate(-50%, -50%) scale(1.5); opacity: 0.7; }
-                        100% { transform: translate(-50%, -50%) scale(1); opacity: 1; }
-                    }
-                    #ai-pointer {
-                        animation: pulse 1s infinite;
-                    }
-                `;
-                document.head.appendChild(style);
-                
-                // Append pointer to body
-                document.body.appendChild(pointer);
-                
-                // Create ripple effect
-                setInterval(() => {
-                    const ripple = pointer.cloneNode();
-                    ripple.style.animation = 'none';
-                    document.body.appendChild(ripple);
-                    ripple.animate([
-                        { transform: 'translate(-50%, -50%) scale(1)', opacity: 0.5 },
-                        { transform: 'translate(-50%, -50%) scale(2)', opacity: 0 }
-                    ], {
-                        duration: 1000,
-                        easing: 'ease-out'
-                    }).onfinish = () => ripple.remove();
-                }, 2000);
-                  // Verify pointer creation
-                return !!document.getElementById('ai-pointer');}"""
-            
             print(f"[BROWSER] Attempting to show pointer at coordinates: ({x}, {y})")
-            # Pass coordinates as a dictionary to match the JavaScript parameters
-            result = await self.page.evaluate(js_code, {'x': x, 'y': y})
+            result = await call_runtime(self.page, "showPointer", {'x': x, 'y': y})
             
             if result:
                 print(f"[BROWSER] Pointer created successfully at ({x}, {y})")
@@ -377,14 +778,11 @@ class Browser:
                 message=f"Error showing pointer: {str(e)}",
             )
         
+    @timed
     async def hide_pointer(self):
         """Remove the visual pointer."""
         try:
-            js_code = """() => {
-                const pointer = document.getElementById('ai-pointer');
-                if (pointer) pointer.remove();
-            }"""
-            await self.page.evaluate(js_code)
+            await call_runtime(self.page, "hidePointer")
             return BrowserActionResult.create_success(
                 action_type="hide_pointer",
                 message="Successfully removed pointer",
@@ -396,18 +794,57 @@ class Browser:
                 message=f"Error removing pointer: {str(e)}",
             )
     
-    async def _switch_to_newest_tab(self):
+    @property
+    def all_pages(self):
+        """Open pages, least recently used first"""
+        return self.tabs.pages
 
-        if not self.auto_switch_to_new_tabs:
-            return False
+    def _track_page(self, page):
+        self.tabs.add(page)
+        page.on("close", self._on_page_closed)
+        if self.watchdog:
+            page.on("crash", self.watchdog.notify_crash)
+
+    def _on_page_closed(self, page):
+        self.tabs.remove(page)
+        # Fall back to the most recently used tab when the current one goes away
+        if page is self.page and self.tabs.newest is not None:
+            self.page = self.tabs.newest
 
-        current_pages = self.context.pages
-        # Trust the caller - they already detected new tabs
-        newest_page = current_pages[-1]  # Get the most recent page
+    async def _on_new_page(self, page):
+        """Handler for the context's `page` event, fired for every new tab or popup, however late it opens."""
+        # Leased tabs and their popups belong to sub-tasks, not to the main tab tracking
+        opener = await page.opener()
+        if opener is None and self._pending_leases:
+            # A tab being leased opens without an opener too, wait until its lease claims it
+            async with self._lease_changed:
+                await self._lease_changed.wait_for(lambda: page in self._leases or not self._pending_leases)
+        if page in self._leases:
+            return
+        lease = next((lease for lease in self._leases.values() if lease.owns(opener)), None) if opener else None
+        if lease:
+            lease.popups.append(page)
+            return
+        self._track_page(page)
+        if self.auto_switch_to_new_tabs:
+            waiter = self._popup_waiter
+            if waiter and not waiter.done():
+                # A click is waiting for it and switches itself
+                waiter.set_result(page)
+                return
+            try:
+                # Between actions, never in the middle of one or of an observation
+                async with self._actions.mutating():
+                    await self._switch_to_tab(page)
+            except Exception as e:
+                browser_error(f"Error switching to new tab: {e}")
+        await self._close_stale_tabs()
+
+    async def _switch_to_tab(self, page):
         
         # Update our tracking
-        self.page = newest_page
-        self.all_pages = list(current_pages)
+        self.page = page
+        self.tabs.touch(page)
         
         # Bring to front and ensure it's ready
         await self.page.bring_to_front()
@@ -418,185 +855,79 @@ class Browser:
 
         print(f"[BROWSER] 🔄 Switched to new tab: {self.page.url}")
         return True
+
+    async def _close_stale_tabs(self):
+        """Close background tabs that went idle or exceed the open tab cap."""
+        for page in self.tabs.stale_pages(current=self.page):
+            self.tabs.remove(page)
+            try:
+                await page.close()
+                browser_info(f"Closed stale tab: {page.url}")
+            except Exception as e:
+                browser_error(f"Error closing stale tab: {e}")
+    
+    @property
+    def leased_tabs(self) -> int:
+        """Tabs leased to sub-tasks, or being opened for them."""
+        return len(self._leases) + self._pending_leases
+
+    @asynccontextmanager
+    async def lease_page(self):
+        """
+        Lease a fresh tab for a concurrent sub-task, waiting while `max_parallel_tabs` are out.
+        Within the block `self.page` resolves to the leased tab, so all `Browser` methods act on it.
+        """
+        async with self._lease_slots:
+            self._pending_leases += 1
+            try:
+                page = await self.context.new_page()
+                lease = PageLease(page, DomSnapshotter(), ActionExecutor())
+                self._leases[page] = lease
+            finally:
+                self._pending_leases -= 1
+                async with self._lease_changed:
+                    self._lease_changed.notify_all()
+            
+            token = current_lease.set(lease)
+            try:
+                yield page
+            finally:
+                current_lease.reset(token)
+                del self._leases[page]
+                # Popups the sub-task opened go with its tab
+                for leased in [*lease.popups, page]:
+                    try:
+                        await leased.close()
+                    except Exception as e:
+                        browser_error(f"Error closing leased tab: {e}")
     
     def set_auto_switch_tabs(self, enabled: bool):
         """Enable or disable automatic switching to new tabs"""
         self.auto_switch_to_new_tabs = enabled
         print(f"[BROWSER] Auto-switch to new tabs: {'enabled' if enabled else 'disabled'}")
         
+    @timed
     async def get_all_tabs_info(self):
         """Get information about all open tabs"""
+        pages = self.context.pages
+        titles = await asyncio.gather(*(page.title() for page in pages), return_exceptions=True)
         tabs_info = []
-        for i, page in enumerate(self.context.pages):
-            try:
-                title = await page.title()
-                tabs_info.append({
-                    "index": i,
-                    "url": page.url,
-                    "title": title,
-                    "is_current": page == self.page
-                })
-            except Exception as e:
-                tabs_info.append({
-                    "index": i,
-                    "url": page.url,
-                    "title": f"Error getting title: {str(e)}",
-                    "is_current": page == self.page
-                })
+        for i, (page, title) in enumerate(zip(pages, titles)):
+            if isinstance(title, Exception):
+                title = f"Error getting title: {str(title)}"
+            tabs_info.append({
+                "index": i,
+                "url": page.url,
+                "title": title,
+                "is_current": page == self.page
+            })
         return tabs_info
     
+    @timed
     async def show_pointer_pro(self, x:float, y:float):
         try: 
-            js_code = r"""(coords) => {
-    // Remove existing cursor animations
-    document.querySelectorAll('.ai-cursor-container, .ai-cursor-splash').forEach(el => el.remove());
-
-    const container = document.createElement('div');
-    container.className = 'ai-cursor-container';
-    container.style.cssText = `
-        position: fixed;
-        left: ${coords.x}px;
-        top: ${coords.y}px;
-        pointer-events: none;
-        z-index: 2147483647;
-    `;
-    document.body.appendChild(container);
-
-    const cursor = document.createElement('div');
-    cursor.className = 'ai-cursor-icon';
-    cursor.innerHTML = `
-        <svg width="24" height="24" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-            <path d="M3 3L10.07 19.97L12.58 12.58L19.97 10.07L3 3Z" fill="#3b82f6" stroke="#1e40af" stroke-width="1"/>
-        </svg>
-    `;
-    cursor.style.cssText = `
-        position: absolute;
-        transform: translate(-12px, -12px);
-        transition: all 0.3s ease-in-out;
-        filter: drop-shadow(0 4px 6px rgba(0, 0, 0, 0.1));
-    `;
-    container.appendChild(cursor);
-
-    setTimeout(() => {
-        cursor.style.opacity = '0';
-        cursor.style.transform = 'translate(-12px, -12px) scale(0.8)';
-        cursor.animate([
-            { opacity: 0, transform: 'translate(-12px, -12px) scale(0.8)' },
-            { opacity: 1, transform: 'translate(-12px, -12px) scale(1)' }
-        ], {
-            duration: 300,
-            fill: 'forwards'
-        });
-
-        setTimeout(() => {
-            cursor.animate([
-                { transform: 'translate(-12px, -12px) scale(1) rotate(0deg)' },
-                { transform: 'translate(-12px, -12px) scale(0.9) rotate(15deg)' },
-                { transform: 'translate(-12px, -12px) scale(1) rotate(0deg)' }
-            ], {
-                duration: 300,
-                easing: 'ease-in-out'
-            });
-
-            const ripple = document.createElement('div');
-            ripple.className = 'ai-cursor-ripple';
-            ripple.style.cssText = `
-                position: absolute;
-                width: 40px;
-                height: 40px;
-                border: 2px solid #3b82f6;
-                border-radius: 50%;
-                transform: translate(-20px, -20px);
-                opacity: 0.7;
-            `;
-            container.appendChild(ripple);
-
-            ripple.animate([
-                { transform: 'translate(-20px, -20px) scale(0.5)', opacity: 0.7 },
-                { transform: 'translate(-20px, -20px) scale(2)', opacity: 0 }
-            ], {
-                duration: 600,
-                easing: 'ease-out'
-            });
-
-            setTimeout(() => {
-                createSplashEffect(container);
-            }, 200);
-
-        }, 1000);
-
-    }, 100);
-
-    function createSplashEffect(container) {
-        const splashContainer = document.createElement('div');
-        splashContainer.className = 'ai-cursor-splash';
-        splashContainer.style.cssText = `
-            position: absolute;
-            transform: translate(-50px, -50px);
-        `;
-        container.appendChild(splashContainer);
-
-        for (let i = 0; i < 3; i++) {
-            const circle = document.createElement('div');
-            circle.style.cssText = `
-                position: absolute;
-                width: ${80 + i * 20}px;
-                height: ${80 + i * 20}px;
-                border-radius: 50%;
-                background: linear-gradient(45deg, #3b82f6, #8b5cf6);
-                opacity: ${0.3 - i * 0.1};
-                transform: translate(-50%, -50%);
-            `;
-            splashContainer.appendChild(circle);
-
-            circle.animate([
-                { transform: 'translate(-50%, -50%) scale(0.5)', opacity: 0.3 - i * 0.1 },
-                { transform: 'translate(-50%, -50%) scale(3)', opacity: 0 }
-            ], {
-                duration: 600,
-                delay: i * 75,
-                easing: 'ease-out'
-            });
-        }
-
-        const numberOfParticles = 8;
-        for (let i = 0; i < numberOfParticles; i++) {
-            const particle = document.createElement('div');
-            const angle = (i / numberOfParticles) * 360;
-            const distance = 30 + Math.random() * 20;
-            const radians = angle * Math.PI / 180;
-            const endX = Math.cos(radians) * distance;
-            const endY = Math.sin(radians) * distance;
-
-            particle.style.cssText = `
-                position: absolute;
-                width: 8px;
-                height: 8px;
-                background: linear-gradient(45deg, #3b82f6, #8b5cf6);
-                border-radius: 50%;
-                transform: translate(-4px, -4px);
-            `;
-            splashContainer.appendChild(particle);
-
-            particle.animate([
-                { transform: 'translate(-4px, -4px) scale(1)', opacity: 0.8 },
-                { transform: 'translate(${endX}px, ${endY}px) scale(0)', opacity: 0 }
-            ], {
-                duration: 800,
-                delay: i * 50,
-                easing: 'ease-out'
-            });
-        }
-    }
-
-    setTimeout(() => {
-        container.remove();
-    }, 2500);
-}"""
-
             print(f"[BROWSER] Attempting to show pointer at coordinates: ({x}, {y})")
-            # Pass coordinates as a dictionary to match the JavaScript parameters
-            result = await self.page.evaluate(js_code, {'x': x, 'y': y})
+            result = await call_runtime(self.page, "showPointerPro", {'x': x, 'y': y})
         
             if result:
                 print(f"[BROWSER] Pointer created successfully at ({x}, {y})")
@@ -0,0 +1,79 @@
+"""
+Coordinate spaces of a captured frame.
+Each screenshot is recorded with the real CSS viewport, the device scale factor, the pixel size
+of the image and the page region it shows, so coordinates the model gives on the image
+(normalized 0-1000 or in image pixels) map back exactly to CSS pixels for mouse events.
+"""
+import struct
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+MODEL_COORD_RANGE = 1000.0
+
+
+def image_size(data: bytes) -> Optional[tuple[int, int]]:
+    """Pixel size of a PNG or JPEG image, read from its header."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            length = struct.unpack(">H", data[i + 2:i + 4])[0]
+            # Start of frame markers carry the dimensions
+            if marker in (0xC0, 0xC1, 0xC2):
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+    return None
+
+
+@dataclass(slots=True)
+class FrameGeometry:
+    viewport_width: float  # CSS pixels
+    viewport_height: float
+    device_scale_factor: float
+    image_width: int  # pixels of the captured image
+    image_height: int
+    # Page region shown by the image, in CSS pixels relative to the viewport, the full viewport by default
+    region_x: float = 0.0
+    region_y: float = 0.0
+    region_width: Optional[float] = None
+    region_height: Optional[float] = None
+
+    def __post_init__(self):
+        if self.region_width is None:
+            self.region_width = self.viewport_width
+        if self.region_height is None:
+            self.region_height = self.viewport_height
+
+    def normalized_to_css(self, x: float, y: float, coord_range: float = MODEL_COORD_RANGE) -> tuple[float, float]:
+        """Map coordinates normalized to 0-`coord_range` over the image to CSS viewport pixels."""
+        return (
+            self.region_x + x / coord_range * self.region_width,
+            self.region_y + y / coord_range * self.region_height,
+        )
+
+    def image_to_css(self, x: float, y: float) -> tuple[float, float]:
+        """Map image pixel coordinates to CSS viewport pixels."""
+        return (
+            self.region_x + x * self.region_width / self.image_width,
+            self.region_y + y * self.region_height / self.image_height,
+        )
+
+    def css_to_image(self, x: float, y: float) -> tuple[float, float]:
+        """Map CSS viewport pixels to image pixel coordinates."""
+        return (
+            (x - self.region_x) * self.image_width / self.region_width,
+            (y - self.region_y) * self.image_height / self.region_height,
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FrameGeometry":
+        return cls(**data)
@@ -0,0 +1,56 @@
+"""
+Compact DOM snapshots for the model.
+The page is reduced to a pruned, indented outline of visible text and interactive elements.
+The page runtime's MutationObserver counts DOM changes, so unchanged pages are not
+re-extracted, and after the first capture only the line diff against the previous snapshot is sent.
+"""
+import difflib
+from typing import Optional
+from .runtime import call_runtime
+
+NO_CHANGES = "No DOM changes since the last step."
+
+
+class DomSnapshotter:
+    """Keeps the previous snapshot of the current page and turns new captures into diffs."""
+
+    def __init__(self, max_lines: int = 400):
+        self.max_lines = max_lines
+        self._lines: Optional[list[str]] = None
+        self._url: Optional[str] = None
+        self._mutations: Optional[int] = None
+
+    def reset(self):
+        self._lines = None
+        self._url = None
+        self._mutations = None
+
+    async def capture(self, page) -> tuple[str, bool]:
+        """
+        Returns the text to send and whether it is a full snapshot.
+        Full on the first capture and after navigation, otherwise a `+`/`-` line diff.
+        """
+        # Nothing to extract when the observer saw no mutations on the same document
+        if page.url == self._url and self._mutations is not None and self._mutations >= 0:
+            readiness = await call_runtime(page, "readiness")
+            if readiness["mutations"] == self._mutations:
+                return NO_CHANGES, False
+
+        snapshot = await call_runtime(page, "domSnapshot", self.max_lines)
+        lines, previous = snapshot["lines"], self._lines
+        is_full = previous is None or page.url != self._url
+        self._lines, self._url, self._mutations = lines, page.url, snapshot["mutations"]
+
+        if is_full:
+            return "\n".join(lines), True
+
+        diff = [
+            line for line in difflib.unified_diff(previous, lines, lineterm="", n=0)
+            if not line.startswith(("---", "+++", "@@"))
+        ]
+        if not diff:
+            return NO_CHANGES, False
+        # A diff bigger than the page itself is not worth it
+        if len(diff) >= len(lines):
+            return "\n".join(lines), True
+        return "\n".join(diff), False
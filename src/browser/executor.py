@@ -0,0 +1,61 @@
+"""
+Per-session action executor.
+Page-mutating actions run one at a time, in the order they were issued, so several tool calls
+from one model message can't race on the same page. Read-only actions (tab info, screenshots,
+DOM reads) run concurrently with each other once the mutations issued before them are done.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class ActionExecutor:
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._readers = 0
+
+    def _advance(self):
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.remove(self._serving)
+            self._serving += 1
+
+    @asynccontextmanager
+    async def mutating(self):
+        # The ticket is taken before the first suspension, so tool calls keep the order they were issued in
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        try:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._serving == ticket and self._readers == 0)
+        except BaseException:
+            async with self._condition:
+                if self._serving == ticket:
+                    self._advance()
+                else:
+                    self._abandoned.add(ticket)
+                self._condition.notify_all()
+            raise
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._advance()
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def read_only(self):
+        # Reads see the page after every mutation issued before them
+        issued = self._next_ticket
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._serving >= issued)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
@@ -0,0 +1,75 @@
+"""
+Set-of-marks observation support.
+Indexes the visible interactive elements of a page and draws numbered marks over them,
+so the model can answer with an element id that is resolved locally to coordinates.
+"""
+
+INTERACTIVE_SELECTOR = (
+    "a[href], button, input:not([type=hidden]), select, textarea, summary, "
+    "[role=button], [role=link], [role=checkbox], [role=radio], [role=tab], [role=menuitem], "
+    "[role=option], [role=switch], [role=combobox], [role=textbox], [contenteditable=''], "
+    "[contenteditable=true], [onclick], [tabindex]:not([tabindex='-1'])"
+)
+
+# Returns the visible interactive elements in viewport (CSS pixel) coordinates.
+INDEX_ELEMENTS_JS = """(selector) => {
+    const elements = [];
+    const vw = window.innerWidth, vh = window.innerHeight;
+    for (const el of document.querySelectorAll(selector)) {
+        const rect = el.getBoundingClientRect();
+        if (rect.width < 2 || rect.height < 2) continue;
+        if (rect.bottom < 0 || rect.right < 0 || rect.top > vh || rect.left > vw) continue;
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none' || parseFloat(style.opacity) === 0) continue;
+
+        // Skip elements covered by something else at their center
+        const cx = Math.min(Math.max(rect.left + rect.width / 2, 0), vw - 1);
+        const cy = Math.min(Math.max(rect.top + rect.height / 2, 0), vh - 1);
+        const top = document.elementFromPoint(cx, cy);
+        if (top && top !== el && !el.contains(top) && !top.contains(el)) continue;
+
+        const text = (el.getAttribute('aria-label') || el.innerText || el.value || el.placeholder || el.title || el.alt || '')
+            .replace(/\\s+/g, ' ').trim().slice(0, 60);
+        elements.push({
+            id: elements.length,
+            tag: el.tagName.toLowerCase(),
+            role: el.getAttribute('role') || el.type || null,
+            text: text,
+            x: Math.round(rect.left), y: Math.round(rect.top),
+            width: Math.round(rect.width), height: Math.round(rect.height),
+        });
+    }
+    return elements;
+}"""
+
+DRAW_MARKS_JS = """(elements) => {
+    document.getElementById('ai-marks')?.remove();
+    const layer = document.createElement('div');
+    layer.id = 'ai-marks';
+    layer.style.cssText = 'position:fixed;left:0;top:0;width:0;height:0;pointer-events:none;z-index:2147483647;';
+    const colors = ['#e6194b', '#3cb44b', '#4363d8', '#f58231', '#911eb4', '#008080'];
+    for (const el of elements) {
+        const color = colors[el.id % colors.length];
+        const box = document.createElement('div');
+        box.style.cssText = `position:fixed;left:${el.x}px;top:${el.y}px;width:${el.width}px;height:${el.height}px;` +
+            `border:2px solid ${color};box-sizing:border-box;`;
+        const label = document.createElement('div');
+        label.textContent = el.id;
+        label.style.cssText = `position:fixed;left:${el.x}px;top:${Math.max(el.y - 14, 0)}px;background:${color};` +
+            'color:white;font:bold 11px monospace;padding:0 2px;line-height:14px;';
+        layer.appendChild(box);
+        layer.appendChild(label);
+    }
+    document.documentElement.appendChild(layer);
+}"""
+
+CLEAR_MARKS_JS = """() => document.getElementById('ai-marks')?.remove()"""
+
+
+def format_element_table(elements: list[dict]) -> str:
+    """Compact one-line-per-element table for the model prompt."""
+    lines = []
+    for el in elements:
+        kind = el["tag"] if not el.get("role") else f"{el['tag']}/{el['role']}"
+        lines.append(f"[{el['id']}] {kind} '{el['text']}'")
+    return "\n".join(lines)
@@ -0,0 +1,129 @@
+"""
+Chromium launch profiles.
+A profile bundles the headless flag, Chromium flags, the remote debugging port policy and whether
+sandboxed browsers share one Chromium process. Ports are picked per instance, so several browsers
+run on one host without conflicts. Selected with `Browser(profile=...)` or BROWSER_PROFILE.
+"""
+import asyncio
+import os
+import socket
+from typing import Optional
+from pydantic import BaseModel, Field
+from playwright.async_api import async_playwright
+from ..utils.logger import browser_info
+
+COMMON_ARGS = [
+    "--disable-extensions",
+    "--disable-file-system",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
+# Background work a throughput host doesn't need, and throttling that would stall background tabs
+LEAN_ARGS = [
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-dev-shm-usage",
+    "--window-size=1280,800",
+]
+
+
+class LaunchProfile(BaseModel):
+    name: str
+    headless: bool = Field(False, description="Run Chromium without a window")
+    args: list[str] = Field(default_factory=list, description="Chromium flags added to the common ones")
+    debug_port: Optional[int] = Field(None, description="Remote debugging port, 0 picks a free port per browser, None disables it")
+    shared_process: bool = Field(False, description="Sandboxed browsers share one Chromium process, each in its own context")
+
+
+PROFILES = {
+    "headful-debug": LaunchProfile(
+        name="headful-debug",
+        headless=False,
+        args=["--start-maximized"],
+        debug_port=0,
+    ),
+    "headless-throughput": LaunchProfile(
+        name="headless-throughput",
+        headless=True,
+        args=LEAN_ARGS + ["--disable-gpu", "--hide-scrollbars"],
+        shared_process=True,
+    ),
+    "low-memory": LaunchProfile(
+        name="low-memory",
+        headless=True,
+        args=LEAN_ARGS + [
+            "--disable-gpu",
+            "--renderer-process-limit=2",
+            "--js-flags=--max-old-space-size=256",
+            "--disable-features=BackForwardCache,Translate,MediaRouter,OptimizationHints",
+            "--disk-cache-size=33554432",
+        ],
+        shared_process=True,
+    ),
+}
+
+
+def get_launch_profile(name: Optional[str] = None) -> LaunchProfile:
+    """Profile by name, or the one named by BROWSER_PROFILE, headful-debug by default."""
+    name = name or os.getenv("BROWSER_PROFILE", "headful-debug")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown browser profile '{name}', expected one of {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def free_port() -> int:
+    """A TCP port free on this host right now, for a per-instance remote debugging port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SharedChromium:
+    """One Chromium process per profile and executable, shared by sandboxed browsers and closed with its last user."""
+
+    _processes: dict[tuple, "SharedChromium"] = {}
+    _lock = asyncio.Lock()
+
+    def __init__(self, playwright, browser):
+        self.playwright = playwright
+        self.browser = browser
+        self.users = 0
+
+    @classmethod
+    async def acquire(cls, key: tuple, launch_options: dict):
+        """Playwright and Chromium browser for `key`, launching the process on first use or after it died."""
+        async with cls._lock:
+            shared = cls._processes.get(key)
+            if shared and not shared.browser.is_connected():
+                await shared.playwright.stop()
+                shared = None
+            if shared is None:
+                playwright = await async_playwright().start()
+                browser = await playwright.chromium.launch(**launch_options)
+                shared = cls._processes[key] = SharedChromium(playwright, browser)
+                browser_info(f"Launched shared Chromium process for {key[0]}")
+            shared.users += 1
+            return shared.playwright, shared.browser
+
+    @classmethod
+    async def release(cls, key: tuple):
+        async with cls._lock:
+            shared = cls._processes.get(key)
+            if shared is None:
+                return
+            shared.users -= 1
+            if shared.users > 0:
+                return
+            del cls._processes[key]
+            try:
+                await shared.browser.close()
+            finally:
+                await shared.playwright.stop()
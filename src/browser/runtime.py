@@ -0,0 +1,262 @@
+"""
+Page runtime.
+A single helper bundle installed on the context with `add_init_script`, so every document starts
+with it: the pointer overlays, the focus probe, element indexing and marks, scroll helpers and the
+readiness observer. Actions call its small named functions through `call_runtime` instead of
+shipping and re-parsing the full script sources with every `page.evaluate`.
+"""
+from .marks import INDEX_ELEMENTS_JS, DRAW_MARKS_JS, CLEAR_MARKS_JS
+from .scrolling import FIND_TARGET_JS, SCROLL_STEP_JS
+
+# Counts mutations since the document was created (read back by the DOM snapshotter) and when the last one happened
+READINESS_JS = """(() => {
+    window.__aiDomMutations = 0;
+    let lastMutation = performance.now();
+    const start = () => new MutationObserver((records) => {
+        window.__aiDomMutations += records.length;
+        lastMutation = performance.now();
+    }).observe(document.documentElement, { subtree: true, childList: true, characterData: true, attributes: true });
+    if (document.documentElement) start();
+    else document.addEventListener('DOMContentLoaded', start, { once: true });
+    return () => ({
+        readyState: document.readyState,
+        mutations: window.__aiDomMutations,
+        quietMs: Math.round(performance.now() - lastMutation),
+    });
+})()"""
+
+FOCUSED_ELEMENT_JS = """() => {
+    const el = document.activeElement;
+    return { tag: el?.tagName, isContentEditable: el?.isContentEditable };
+}"""
+
+# Viewport boxes of visible elements whose text or label-like attributes contain each text, without scrolling
+LOCATE_TEXT_JS = """({ texts, limit }) => {
+    const vw = window.innerWidth, vh = window.innerHeight;
+    const inView = (rect) => rect.width > 0 && rect.height > 0 && rect.bottom > 0 && rect.right > 0 && rect.top < vh && rect.left < vw;
+    const box = (rect) => ({ x: rect.left, y: rect.top, width: rect.width, height: rect.height });
+    return texts.map((text) => {
+        const needle = text.toLowerCase();
+        const boxes = [];
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode() && boxes.length < limit) {
+            const el = walker.currentNode.parentElement;
+            if (!el || !walker.currentNode.textContent.toLowerCase().includes(needle)) continue;
+            const rect = el.getBoundingClientRect();
+            if (inView(rect)) boxes.push(box(rect));
+        }
+        for (const el of document.querySelectorAll('[aria-label], [placeholder], [title], [alt]')) {
+            if (boxes.length >= limit) break;
+            const matches = ['aria-label', 'placeholder', 'title', 'alt'].some((attr) => (el.getAttribute(attr) || '').toLowerCase().includes(needle));
+            const rect = el.getBoundingClientRect();
+            if (matches && inView(rect)) boxes.push(box(rect));
+        }
+        return boxes;
+    });
+}"""
+
+# Pruned outline of visible text and interactive elements, see `DomSnapshotter`
+SNAPSHOT_JS = """(maxLines) => {
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'SVG', 'TEMPLATE', 'IFRAME', 'CANVAS', 'META', 'LINK', 'HEAD']);
+    const INTERACTIVE = new Set(['A', 'BUTTON', 'INPUT', 'SELECT', 'TEXTAREA', 'SUMMARY', 'LABEL']);
+    const LANDMARK = new Set(['H1', 'H2', 'H3', 'H4', 'H5', 'H6', 'FORM', 'NAV', 'MAIN', 'DIALOG', 'TABLE', 'UL', 'OL', 'LI']);
+    const lines = [];
+    const clean = (s) => (s || '').replace(/\\s+/g, ' ').trim().slice(0, 120);
+
+    const walk = (node, depth) => {
+        if (lines.length >= maxLines) return;
+        if (node.nodeType === Node.TEXT_NODE) {
+            const text = clean(node.textContent);
+            if (text) lines.push('  '.repeat(depth) + JSON.stringify(text));
+            return;
+        }
+        if (node.nodeType !== Node.ELEMENT_NODE || SKIP.has(node.tagName)) return;
+        const style = getComputedStyle(node);
+        if (style.display === 'none' || style.visibility === 'hidden' || node.getAttribute('aria-hidden') === 'true') return;
+
+        const role = node.getAttribute('role');
+        let next = depth;
+        if (INTERACTIVE.has(node.tagName) || LANDMARK.has(node.tagName) || role) {
+            let line = node.tagName.toLowerCase();
+            if (role) line += `[${role}]`;
+            if (node.type && node.tagName === 'INPUT') line += `:${node.type}`;
+            const label = clean(node.getAttribute('aria-label') || node.placeholder || node.value || node.getAttribute('href'));
+            if (label) line += ` ${JSON.stringify(label)}`;
+            lines.push('  '.repeat(depth) + line);
+            next = depth + 1;
+        }
+        for (const child of node.childNodes) walk(child, next);
+    };
+    if (document.body) walk(document.body, 0);
+    return { lines: lines, mutations: window.__aiDomMutations ?? -1 };
+}"""
+
+# Prefetch/preconnect hints for likely next URLs, so their connections and documents are warm
+PREFETCH_JS = """(urls) => {
+    for (const url of urls) {
+        for (const rel of ['preconnect', 'prefetch']) {
+            const link = document.createElement('link');
+            link.rel = rel;
+            link.href = rel === 'preconnect' ? new URL(url).origin : url;
+            document.head.appendChild(link);
+        }
+    }
+}"""
+
+VIEWPORT_JS = """() => ({ width: window.innerWidth, height: window.innerHeight, dpr: window.devicePixelRatio, scrollX: window.scrollX, scrollY: window.scrollY })"""
+
+SHOW_POINTER_JS = """(() => {
+    let ripples = null;
+    return ({ x, y }) => {
+        document.getElementById('ai-pointer')?.remove();
+        clearInterval(ripples);
+        if (!document.getElementById('ai-pointer-style')) {
+            const style = document.createElement('style');
+            style.id = 'ai-pointer-style';
+            style.textContent = `
+                @keyframes ai-pulse {
+                    0% { transform: translate(-50%, -50%) scale(1); opacity: 1; }
+                    50% { transform: translate(-50%, -50%) scale(1.5); opacity: 0.7; }
+                    100% { transform: translate(-50%, -50%) scale(1); opacity: 1; }
+                }
+                #ai-pointer { animation: ai-pulse 1s infinite; }
+            `;
+            document.documentElement.appendChild(style);
+        }
+
+        const pointer = document.createElement('div');
+        pointer.id = 'ai-pointer';
+        pointer.style.cssText = `
+            position: fixed; width: 8px; height: 8px;
+            background: rgba(255, 0, 0, 0.7); border: 3px solid white; border-radius: 50%;
+            pointer-events: none; transform: translate(-50%, -50%); z-index: 2147483647;
+            left: ${x}px; top: ${y}px; box-shadow: 0 0 15px red;
+        `;
+        document.body.appendChild(pointer);
+
+        ripples = setInterval(() => {
+            if (!pointer.isConnected) return clearInterval(ripples);
+            const ripple = pointer.cloneNode();
+            ripple.removeAttribute('id');
+            ripple.style.animation = 'none';
+            document.body.appendChild(ripple);
+            ripple.animate([
+                { transform: 'translate(-50%, -50%) scale(1)', opacity: 0.5 },
+                { transform: 'translate(-50%, -50%) scale(2)', opacity: 0 }
+            ], { duration: 1000, easing: 'ease-out' }).onfinish = () => ripple.remove();
+        }, 2000);
+        return !!document.getElementById('ai-pointer');
+    };
+})()"""
+
+HIDE_POINTER_JS = """() => document.getElementById('ai-pointer')?.remove()"""
+
+SHOW_POINTER_PRO_JS = r"""({ x, y }) => {
+    document.querySelectorAll('.ai-cursor-container').forEach((el) => el.remove());
+
+    const container = document.createElement('div');
+    container.className = 'ai-cursor-container';
+    container.style.cssText = `position: fixed; left: ${x}px; top: ${y}px; pointer-events: none; z-index: 2147483647;`;
+    document.body.appendChild(container);
+
+    const cursor = document.createElement('div');
+    cursor.innerHTML = `
+        <svg width="24" height="24" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+            <path d="M3 3L10.07 19.97L12.58 12.58L19.97 10.07L3 3Z" fill="#3b82f6" stroke="#1e40af" stroke-width="1"/>
+        </svg>
+    `;
+    cursor.style.cssText = `position: absolute; transform: translate(-12px, -12px); filter: drop-shadow(0 4px 6px rgba(0, 0, 0, 0.1));`;
+    container.appendChild(cursor);
+    cursor.animate([
+        { opacity: 0, transform: 'translate(-12px, -12px) scale(0.8)' },
+        { opacity: 1, transform: 'translate(-12px, -12px) scale(1)' }
+    ], { duration: 300, delay: 100, fill: 'forwards' });
+
+    const splash = () => {
+        const splashContainer = document.createElement('div');
+        splashContainer.className = 'ai-cursor-splash';
+        container.appendChild(splashContainer);
+        for (let i = 0; i < 3; i++) {
+            const circle = document.createElement('div');
+            circle.style.cssText = `
+                position: absolute; width: ${80 + i * 20}px; height: ${80 + i * 20}px; border-radius: 50%;
+                background: linear-gradient(45deg, #3b82f6, #8b5cf6); transform: translate(-50%, -50%);
+            `;
+            splashContainer.appendChild(circle);
+            circle.animate([
+                { transform: 'translate(-50%, -50%) scale(0.5)', opacity: 0.3 - i * 0.1 },
+                { transform: 'translate(-50%, -50%) scale(3)', opacity: 0 }
+            ], { duration: 600, delay: i * 75, easing: 'ease-out', fill: 'forwards' });
+        }
+        for (let i = 0; i < 8; i++) {
+            const radians = (i / 8) * 2 * Math.PI;
+            const distance = 30 + Math.random() * 20;
+            const particle = document.createElement('div');
+            particle.style.cssText = `
+                position: absolute; width: 8px; height: 8px; border-radius: 50%;
+                background: linear-gradient(45deg, #3b82f6, #8b5cf6); transform: translate(-4px, -4px);
+            `;
+            splashContainer.appendChild(particle);
+            particle.animate([
+                { transform: 'translate(-4px, -4px) scale(1)', opacity: 0.8 },
+                { transform: `translate(${Math.cos(radians) * distance}px, ${Math.sin(radians) * distance}px) scale(0)`, opacity: 0 }
+            ], { duration: 800, delay: i * 50, easing: 'ease-out', fill: 'forwards' });
+        }
+    };
+
+    setTimeout(() => {
+        cursor.animate([
+            { transform: 'translate(-12px, -12px) scale(1) rotate(0deg)' },
+            { transform: 'translate(-12px, -12px) scale(0.9) rotate(15deg)' },
+            { transform: 'translate(-12px, -12px) scale(1) rotate(0deg)' }
+        ], { duration: 300, easing: 'ease-in-out' });
+        const ripple = document.createElement('div');
+        ripple.style.cssText = `
+            position: absolute; width: 40px; height: 40px; border: 2px solid #3b82f6; border-radius: 50%;
+            transform: translate(-20px, -20px); opacity: 0;
+        `;
+        container.appendChild(ripple);
+        ripple.animate([
+            { transform: 'translate(-20px, -20px) scale(0.5)', opacity: 0.7 },
+            { transform: 'translate(-20px, -20px) scale(2)', opacity: 0 }
+        ], { duration: 600, easing: 'ease-out' });
+        setTimeout(splash, 200);
+    }, 1100);
+
+    setTimeout(() => container.remove(), 2500);
+    return true;
+}"""
+
+RUNTIME_FUNCTIONS = {
+    "readiness": READINESS_JS,
+    "focusedElement": FOCUSED_ELEMENT_JS,
+    "viewport": VIEWPORT_JS,
+    "locateText": LOCATE_TEXT_JS,
+    "domSnapshot": SNAPSHOT_JS,
+    "prefetch": PREFETCH_JS,
+    "showPointer": SHOW_POINTER_JS,
+    "hidePointer": HIDE_POINTER_JS,
+    "showPointerPro": SHOW_POINTER_PRO_JS,
+    "indexElements": INDEX_ELEMENTS_JS,
+    "drawMarks": DRAW_MARKS_JS,
+    "clearMarks": CLEAR_MARKS_JS,
+    "findTarget": FIND_TARGET_JS,
+    "scrollStep": SCROLL_STEP_JS,
+}
+
+# Installed once per document, frozen so page scripts can't replace the helpers
+PAGE_RUNTIME_JS = "(() => {\n    if (window.__aiRuntime) return;\n    const runtime = {\n%s\n    };\n    Object.defineProperty(window, '__aiRuntime', { value: Object.freeze(runtime) });\n})();" % ",\n".join(
+    f"        {name}: {source}" for name, source in RUNTIME_FUNCTIONS.items()
+)
+
+# The only source sent per action: the function name and its argument
+CALL_JS = "([name, arg]) => window.__aiRuntime ? { value: window.__aiRuntime[name](arg) } : null"
+
+
+async def call_runtime(page, name: str, arg=None):
+    """Call a runtime function on the page, installing the runtime first on documents that predate the init script."""
+    result = await page.evaluate(CALL_JS, [name, arg])
+    if result is None:
+        await page.evaluate(PAGE_RUNTIME_JS)
+        result = await page.evaluate(CALL_JS, [name, arg])
+    return result.get("value")
@@ -1,18 +1,21 @@
-from pydantic import BaseModel, Field
-from datetime import datetime
-from typing import Optional, Any, Dict
+from dataclasses import dataclass, field
+from typing import Optional, Any
+import time
 
-class BrowserActionResult(BaseModel):
+@dataclass(slots=True)
+class BrowserActionResult:
+    # Plain slotted record created on every browser action
     success: bool
     message: str
     action_type: Optional[str] = None
     data: Optional[dict[str, Any]] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.monotonic)
 
     @classmethod
     def create_success(cls, action_type: str, message: str, data: dict = None) -> "BrowserActionResult":
-        return cls(success=True, action_type=action_type, message=message, data=data)
+        return cls(True, message, action_type, data)
 
     @classmethod
     def create_failure(cls, action_type: str, message: str, error: str = None) -> "BrowserActionResult":
-        return cls(success=False, action_type=action_type, message=message, error=error)
+        return cls(False, message, action_type, None, error)
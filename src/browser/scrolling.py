@@ -0,0 +1,67 @@
+"""
+Content-aware scrolling.
+Scripts to find a target by text or selector, pick the scroll container that actually scrolls
+(the document or the largest nested scrollable element), and step it while reporting its extent,
+so the browser can scroll until a target shows up or the end of an infinite feed is reached.
+"""
+
+# Finds a visible element matching the text or selector and centers it in its scroll containers
+FIND_TARGET_JS = """({ text, selector }) => {
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+    };
+    let target = null;
+    if (selector) {
+        target = Array.from(document.querySelectorAll(selector)).find(visible) || null;
+    } else if (text) {
+        const needle = text.toLowerCase();
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode()) {
+            const el = walker.currentNode.parentElement;
+            if (el && walker.currentNode.textContent.toLowerCase().includes(needle) && visible(el)) { target = el; break; }
+        }
+        if (!target) {
+            // Also match form controls by their label-like attributes
+            target = Array.from(document.querySelectorAll('[aria-label], [placeholder], [title], [alt]')).find((el) =>
+                ['aria-label', 'placeholder', 'title', 'alt'].some((attr) => (el.getAttribute(attr) || '').toLowerCase().includes(needle))
+                && visible(el)) || null;
+        }
+    }
+    if (!target) return null;
+    target.scrollIntoView({ block: 'center', inline: 'nearest' });
+    const rect = target.getBoundingClientRect();
+    return { x: rect.left + rect.width / 2, y: rect.top + rect.height / 2, tag: target.tagName.toLowerCase() };
+}"""
+
+# Scrolls the container by one step and reports its position before and after
+SCROLL_STEP_JS = """({ container, direction, step }) => {
+    const scrollable = (el) => {
+        const style = getComputedStyle(el);
+        return /(auto|scroll|overlay)/.test(style.overflowY) && el.scrollHeight > el.clientHeight + 1;
+    };
+    let el = container ? document.querySelector(container) : null;
+    if (!el) {
+        const root = document.scrollingElement || document.documentElement;
+        if (root.scrollHeight > window.innerHeight + 1) {
+            el = root;
+        } else {
+            // Pages like chats and feeds scroll an inner panel instead of the document
+            let best = null, bestArea = 0;
+            for (const candidate of document.querySelectorAll('body *')) {
+                if (!scrollable(candidate)) continue;
+                const rect = candidate.getBoundingClientRect();
+                const area = rect.width * rect.height;
+                if (area > bestArea) { best = candidate; bestArea = area; }
+            }
+            el = best || root;
+        }
+    }
+    const isRoot = el === document.scrollingElement || el === document.documentElement;
+    const viewport = isRoot ? window.innerHeight : el.clientHeight;
+    const delta = (step || Math.round(viewport * 0.8)) * (direction === 'up' ? -1 : 1);
+    const before = el.scrollTop;
+    el.scrollBy({ top: delta, behavior: 'instant' });
+    return { before: before, after: el.scrollTop, scrollHeight: el.scrollHeight, viewport: viewport, isRoot: isRoot };
+}"""
@@ -0,0 +1,82 @@
+"""
+On-disk cache of browser storage state (cookies, localStorage, IndexedDB), kept per site and identity.
+Snapshots taken after a successful run are injected into new sandboxed contexts at creation,
+so parallel sessions start already logged in without sharing one persistent Chrome profile.
+"""
+import json
+import os
+import re
+import time
+from typing import Optional
+from ..utils.logger import browser_info, browser_warning
+
+
+def _site_matches(host: str, site: str) -> bool:
+    host = host.lstrip(".").lower()
+    site = site.lower()
+    return site == host or site.endswith("." + host)
+
+
+class StorageStateCache:
+    def __init__(self, directory: str = "./storage-states", ttl: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, site: str, identity: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{identity}@{site}")
+        return os.path.join(self.directory, f"{name}.json")
+
+    async def save(self, context, site: str, identity: str = "default"):
+        """Snapshot the cookies and origin storage of `site` from a context."""
+        state = await context.storage_state(indexed_db=True)
+        snapshot = {
+            "saved_at": time.time(),
+            "cookies": [cookie for cookie in state["cookies"] if _site_matches(cookie["domain"], site)],
+            "origins": [
+                origin for origin in state["origins"]
+                if _site_matches(re.sub(r"^\w+://|:\d+$", "", origin["origin"]), site)
+            ],
+        }
+
+        # Write to a temporary file first so concurrent sessions never read a partial snapshot
+        path = self._path(site, identity)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+        browser_info(f"Saved storage state for {site} ({identity}): {len(snapshot['cookies'])} cookies, {len(snapshot['origins'])} origins")
+
+    def load(self, sites: list[str], identity: str = "default") -> Optional[dict]:
+        """
+        Merge the fresh snapshots of `sites` into a single storage state for `new_context(storage_state=...)`.
+        Snapshots older than the TTL are deleted. Returns None if nothing usable is cached.
+        """
+        state = {"cookies": [], "origins": []}
+        for site in sites:
+            path = self._path(site, identity)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                browser_warning(f"Ignoring unreadable storage state {path}: {e}")
+                continue
+
+            if time.time() - snapshot.get("saved_at", 0) > self.ttl:
+                browser_info(f"Storage state for {site} ({identity}) expired")
+                self.invalidate(site, identity)
+                continue
+            state["cookies"] += snapshot["cookies"]
+            state["origins"] += snapshot["origins"]
+
+        if not state["cookies"] and not state["origins"]:
+            return None
+        return state
+
+    def invalidate(self, site: str, identity: str = "default"):
+        try:
+            os.remove(self._path(site, identity))
+        except FileNotFoundError:
+            pass
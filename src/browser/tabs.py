@@ -0,0 +1,78 @@
+"""
+Tab tracking for a browser context.
+Pages are registered from the context's `page` events and kept in least-recently-used order,
+so the browser can cap the number of open tabs and close background tabs that went idle.
+"""
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+from playwright.async_api import Page
+
+
+class TabTracker:
+    """Keeps the open pages of a context ordered from least to most recently used."""
+
+    def __init__(self, max_tabs: int = 8, idle_timeout: float = 300.0):
+        self.max_tabs = max_tabs
+        self.idle_timeout = idle_timeout
+        self._last_used: "OrderedDict[Page, float]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._last_used)
+
+    def __contains__(self, page: Page):
+        return page in self._last_used
+
+    @property
+    def pages(self) -> list[Page]:
+        return list(self._last_used)
+
+    @property
+    def newest(self) -> Optional[Page]:
+        """The most recently used page, if any."""
+        return next(reversed(self._last_used), None)
+
+    def add(self, page: Page):
+        self.touch(page)
+
+    def touch(self, page: Page):
+        """Mark a page as just used and move it to the end of the LRU order."""
+        self._last_used[page] = time.monotonic()
+        self._last_used.move_to_end(page)
+
+    def remove(self, page: Page):
+        self._last_used.pop(page, None)
+
+    def stale_pages(self, current: Optional[Page]) -> list[Page]:
+        """
+        Background pages that should be closed: every page idle for longer than `idle_timeout`,
+        plus the least recently used ones above the `max_tabs` cap. The current page is never returned.
+        """
+        now = time.monotonic()
+        background = [page for page in self._last_used if page is not current]
+
+        stale = [page for page in background if now - self._last_used[page] > self.idle_timeout]
+        overflow = len(self._last_used) - len(stale) - self.max_tabs
+        if overflow > 0:
+            stale += [page for page in background if page not in stale][:overflow]
+        return stale
+
+
+class PageLease:
+    """A tab leased to one sub-task, with its own per-page observation state."""
+
+    def __init__(self, page: Page, dom, actions):
+        self.page = page
+        self.dom = dom
+        self.actions = actions
+        self.element_index: dict[int, dict] = {}
+        # Tabs the leased tab (or its popups) opened, closed with the lease
+        self.popups: list[Page] = []
+
+    def owns(self, page) -> bool:
+        return page is self.page or page in self.popups
+
+
+# Lease of the running task. Asyncio tasks copy the context, so concurrent sub-tasks each see their own tab
+current_lease: ContextVar[Optional[PageLease]] = ContextVar("current_lease", default=None)
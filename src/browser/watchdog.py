@@ -0,0 +1,144 @@
+"""
+Health watchdog for the browser.
+Periodically samples renderer memory and responsiveness over CDP and recycles the context,
+or the whole Chromium process, when the limits are crossed or a page crashes.
+"""
+import asyncio
+import time
+from typing import Optional, TYPE_CHECKING
+from pydantic import BaseModel, Field
+from ..utils.logger import browser_info, browser_warning, browser_error
+
+if TYPE_CHECKING:
+    from .browser import Browser
+
+
+class WatchdogConfig(BaseModel):
+    interval: float = Field(30.0, description="Seconds between health checks")
+    max_page_heap_mb: float = Field(512.0, description="JS heap of a single page that triggers a context recycle")
+    max_total_heap_mb: float = Field(1536.0, description="JS heap over all pages that triggers a process restart")
+    responsiveness_timeout: float = Field(10.0, description="Seconds the current page has to answer a trivial evaluate")
+    max_unresponsive_checks: int = Field(2, description="Consecutive unresponsive checks before the process is restarted")
+
+
+class HealthSample(BaseModel):
+    page_heap_mb: dict[str, float] = Field(default_factory=dict) # by '<tab index>:<url>', tabs can share a URL
+    total_heap_mb: float = 0.0
+    responsive: bool = True
+    latency_ms: Optional[float] = None
+
+
+class BrowserWatchdog:
+    """Background task keeping a `Browser` healthy. Started and stopped by the browser itself."""
+
+    def __init__(self, browser: "Browser", config: WatchdogConfig):
+        self.browser = browser
+        self.config = config
+        self.last_storage_state = None
+        self.last_sample: Optional[HealthSample] = None
+        self.recycles = 0
+        self._unresponsive_checks = 0
+        self._crashed = asyncio.Event()
+        # A crash recycle put off while tabs were leased, retried on the next check
+        self._crash_pending = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        # Recycling re-initializes the browser from inside the watchdog task, which keeps running
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task = self._task
+        if task is None or task is asyncio.current_task():
+            return
+        self._task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def notify_crash(self, page):
+        browser_error(f"Page crashed: {page.url}")
+        self._crashed.set()
+
+    async def sample(self) -> HealthSample:
+        """Collect JS heap usage of every page and the responsiveness of the current one."""
+        sample = HealthSample()
+        for index, page in enumerate(self.browser.context.pages):
+            try:
+                cdp = await self.browser.context.new_cdp_session(page)
+                try:
+                    heap = await cdp.send("Runtime.getHeapUsage")
+                finally:
+                    await cdp.detach()
+                sample.page_heap_mb[f"{index}:{page.url}"] = heap["usedSize"] / (1024 * 1024)
+            except Exception as e:
+                browser_warning(f"Error sampling heap of {page.url}: {e}")
+        sample.total_heap_mb = sum(sample.page_heap_mb.values())
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self.browser.page.evaluate("1"), timeout=self.config.responsiveness_timeout)
+            sample.latency_ms = (time.monotonic() - start) * 1000
+        except Exception:
+            sample.responsive = False
+        return sample
+
+    async def check(self):
+        """Run one health check and recycle the browser if it is over its limits."""
+        if self._crashed.is_set() or self._crash_pending:
+            self._crashed.clear()
+            self._crash_pending = not await self._recycle(restart_process=False, reason="page crashed")
+            return
+
+        sample = await self.sample()
+        self.last_sample = sample
+        self._unresponsive_checks = 0 if sample.responsive else self._unresponsive_checks + 1
+
+        if self._unresponsive_checks >= self.config.max_unresponsive_checks:
+            await self._recycle(restart_process=True, reason="browser unresponsive")
+        elif sample.total_heap_mb > self.config.max_total_heap_mb:
+            await self._recycle(restart_process=True, reason=f"total heap {sample.total_heap_mb:.0f}MB")
+        elif sample.page_heap_mb and max(sample.page_heap_mb.values()) > self.config.max_page_heap_mb:
+            await self._recycle(restart_process=False, reason=f"page heap {max(sample.page_heap_mb.values()):.0f}MB")
+        elif sample.responsive:
+            # Keep a last known good snapshot in case the context can't report its state when recycled
+            try:
+                self.last_storage_state = await self.browser.context.storage_state()
+            except Exception as e:
+                browser_warning(f"Error snapshotting storage state: {e}")
+
+    async def _recycle(self, restart_process: bool, reason: str) -> bool:
+        """Recycle unless sub-tasks hold leased tabs, which the new context would close under them. Returns whether it ran."""
+        kind = 'process' if restart_process else 'context'
+        # Waits for the action in flight, which would otherwise lose its page mid-way
+        async with self.browser.actions.mutating():
+            leased = self.browser.leased_tabs
+            if leased:
+                browser_warning(f"Watchdog deferring {kind} recycle while {leased} tabs are leased: {reason}")
+                return False
+            browser_warning(f"Watchdog recycling browser {kind}: {reason}")
+            self._unresponsive_checks = 0
+            result = await self.browser.recycle(restart_process=restart_process)
+        if result.success:
+            self.recycles += 1
+        else:
+            browser_error(result.message)
+        return True
+
+    async def _run(self):
+        browser_info(f"Watchdog started, checking every {self.config.interval}s")
+        while True:
+            try:
+                await asyncio.wait_for(self._crashed.wait(), timeout=self.config.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                browser_error(f"Watchdog check failed: {e}")
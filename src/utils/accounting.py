@@ -0,0 +1,111 @@
+"""
+Per-session resource and cost accounting.
+Each graph node collects what it spends (model calls and tokens, uploaded image bytes, grounding
+calls and cache hits, Playwright wall time per `Browser` method, screenshots) into a task-local
+collector, and returns it as a `usage` update that the state reducer sums into the session total.
+"""
+import json
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import replace
+from functools import wraps
+from typing import Optional
+from langgraph.types import Command
+
+# Collector of the node running in the current task, None outside accounted nodes
+current_usage: ContextVar[Optional[dict]] = ContextVar("current_usage", default=None)
+
+
+def merge_usage(current: dict, update: dict) -> dict:
+    """Reducer summing usage counters, nested per-node and per-method counters included."""
+    merged = dict(current or {})
+    for key, value in (update or {}).items():
+        if isinstance(value, dict):
+            merged[key] = merge_usage(merged.get(key), value)
+        else:
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def count(key: str, amount: float = 1, per: Optional[str] = None):
+    """Add to a counter of the running node, or to its `per` breakdown (a node, a method)."""
+    usage = current_usage.get()
+    if usage is None:
+        return
+    if per is None:
+        usage[key] = usage.get(key, 0) + amount
+    else:
+        breakdown = usage.setdefault(key, {})
+        breakdown[per] = breakdown.get(per, 0) + amount
+
+
+def record_model_call(node: str, response, image_bytes: int = 0):
+    count("model_calls", per=node)
+    count("image_bytes", image_bytes)
+    metadata = getattr(response, "usage_metadata", None) or {}
+    count("input_tokens", metadata.get("input_tokens", 0))
+    count("output_tokens", metadata.get("output_tokens", 0))
+
+
+def timed(method):
+    """Count calls and Playwright wall time of a `Browser` method."""
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            count("browser_ms", (time.monotonic() - start) * 1000, per=method.__name__)
+            count("browser_calls", per=method.__name__)
+    return wrapper
+
+
+def _with_usage(output, usage: dict):
+    if isinstance(output, Command):
+        return replace(output, update={**(output.update or {}), "usage": merge_usage((output.update or {}).get("usage"), usage)})
+    if isinstance(output, list):
+        return [*output, Command(update={"usage": usage})]
+    if isinstance(output, dict):
+        return {**output, "usage": merge_usage(output.get("usage"), usage)}
+    return output
+
+
+def accounted(func):
+    """Collect what a graph node spends and add it to the node's state update."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        usage = {}
+        token = current_usage.set(usage)
+        try:
+            output = await func(*args, **kwargs)
+        finally:
+            current_usage.reset(token)
+        return _with_usage(output, usage) if usage else output
+    return wrapper
+
+
+def usage_summary(usage: dict) -> str:
+    """One-paragraph summary of a session's usage for logs."""
+    usage = usage or {}
+    calls = usage.get("model_calls", {})
+    browser_ms = usage.get("browser_ms", {})
+    slowest = sorted(browser_ms.items(), key=lambda item: item[1], reverse=True)[:3]
+    return (
+        f"{sum(calls.values())} model calls ({', '.join(f'{node} {n}' for node, n in calls.items()) or 'none'}), "
+        f"{usage.get('input_tokens', 0)} input / {usage.get('output_tokens', 0)} output tokens, "
+        f"{usage.get('image_bytes', 0) / 2**20:.1f}MB of images, "
+        f"{usage.get('grounding_calls', 0)} grounding calls ({usage.get('grounding_cache_hits', 0)} cache hits), "
+        f"{usage.get('screenshots', 0)} screenshots, "
+        f"{sum(browser_ms.values()) / 1000:.1f}s in the browser"
+        + (f" (most in {', '.join(f'{name} {ms / 1000:.1f}s' for name, ms in slowest)})" if slowest else "")
+    )
+
+
+def export_usage(usage: dict, session_id: str, directory: str = "usage", **meta) -> str:
+    """Write a session's usage with its metadata (task, URL, ...) to `<directory>/<session_id>.json`."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{session_id}.json")
+    with open(path, "w") as f:
+        json.dump({"session_id": session_id, **meta, "usage": usage or {}}, f, indent=2)
+    return path
@@ -0,0 +1,157 @@
+"""
+Event-loop blocking detector.
+A heartbeat task measures loop lag, and a watcher thread notices when the heartbeat stops
+for longer than a threshold. It then captures the stack of the loop thread, so the blocking
+callback and the session/node that ran it can be logged. Cheap enough to leave on in production.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from contextvars import ContextVar, Context, copy_context
+from functools import wraps
+from typing import Optional
+from .logger import agent_warning, agent_info
+
+
+# Label of the session/node running in the current context, inherited by the tasks it starts
+current_activity: ContextVar[Optional[str]] = ContextVar("current_activity", default=None)
+
+
+class LoopMonitor:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, stack_limit: int = 15):
+        """
+        Args:
+            threshold: Seconds the loop may be held before it is reported
+            interval: Seconds between heartbeats, the resolution of the lag measurement
+            stack_limit: Innermost frames logged for a blocking callback
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_limit = stack_limit
+        self.lags = deque(maxlen=2000)
+        self.stalls = 0
+        # Context of each task, for Pythons without `Task.get_context` (before 3.12)
+        self._contexts: "weakref.WeakKeyDictionary[asyncio.Task, Context]" = weakref.WeakKeyDictionary()
+        self._previous_factory = None
+        self._beat = time.monotonic()
+        self._stall_report: Optional[tuple[str, str]] = None
+        self._stop = threading.Event()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        if not hasattr(asyncio.Task, "get_context"):
+            self._previous_factory = self.loop.get_task_factory()
+            self.loop.set_task_factory(self._task_factory)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+        agent_info(f"Loop monitor started, reporting callbacks holding the loop over {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if not hasattr(asyncio.Task, "get_context") and self.loop.get_task_factory() == self._task_factory:
+            self.loop.set_task_factory(self._previous_factory)
+
+    def _task_factory(self, loop, coro, context: Optional[Context] = None):
+        context = context or copy_context()
+        if self._previous_factory:
+            task = self._previous_factory(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        self._contexts[task] = context
+        return task
+
+    def _activity(self, task: Optional[asyncio.Task]) -> str:
+        """Label of a task, read from its context so subtasks of a node report the node."""
+        if task is None:
+            return "a loop callback"
+        context = task.get_context() if hasattr(task, "get_context") else self._contexts.get(task)
+        return (context.get(current_activity) if context is not None else None) or task.get_name()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - expected
+            self.lags.append(lag)
+            self._beat = now
+
+            if lag > self.threshold:
+                self.stalls += 1
+                activity, stack = self._stall_report or ("unknown", "stack not captured\n")
+                agent_warning(f"Event loop blocked for {lag * 1000:.0f}ms in {activity}\n{stack}")
+            self._stall_report = None
+
+    def _watch(self):
+        """Runs in its own thread, catching the loop thread while it is still blocked."""
+        while not self._stop.wait(self.threshold / 2):
+            if self._stall_report or time.monotonic() - self._beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame)[-self.stack_limit:])
+            task = asyncio.current_task(self.loop)
+            self._stall_report = (self._activity(task), stack)
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        return {
+            "lag_p50_ms": lags[len(lags) // 2] * 1000 if lags else 0.0,
+            "lag_p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000 if lags else 0.0,
+            "lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+            "stalls": self.stalls,
+        }
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor(threshold: float = None) -> Optional[LoopMonitor]:
+    """Start the loop monitor on the running loop, if enabled with LOOP_MONITOR=1 or an explicit threshold."""
+    global _monitor
+    if threshold is None:
+        if os.getenv("LOOP_MONITOR", "0") not in ("1", "true"):
+            return None
+        threshold = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", "100")) / 1000
+    if _monitor is None:
+        _monitor = LoopMonitor(threshold=threshold)
+        _monitor.start()
+    return _monitor
+
+
+def stop_loop_monitor():
+    global _monitor
+    if _monitor is not None:
+        _monitor.stop()
+        _monitor = None
+
+
+def get_loop_monitor() -> Optional[LoopMonitor]:
+    return _monitor
+
+
+def monitored(node: str):
+    """Label a graph node with its session and name, for reports of the callbacks it blocks the loop with."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(state, *args, **kwargs):
+            token = current_activity.set(f"session {state.get('session_id', '?')} / {node}")
+            try:
+                return await func(state, *args, **kwargs)
+            finally:
+                current_activity.reset(token)
+        return wrapper
+    return decorator
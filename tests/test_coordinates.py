@@ -0,0 +1,93 @@
+import struct
+import zlib
+
+import pytest
+
+from src.browser.coordinates import FrameGeometry, image_size
+
+
+def png(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+
+def jpeg(width: int, height: int, marker: int = 0xC0) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof = bytes([0xFF, marker]) + struct.pack(">HBHHB", 17, 8, height, width, 3) + b"\x01\x11\x00\x02\x11\x01\x03\x11\x01"
+    return b"\xff\xd8" + app0 + sof + b"\xff\xd9"
+
+
+@pytest.mark.parametrize("width,height", [(1280, 800), (2560, 1600), (1, 1), (640, 4000)])
+def test_image_size_png(width, height):
+    assert image_size(png(width, height)) == (width, height)
+
+
+@pytest.mark.parametrize("marker", [0xC0, 0xC1, 0xC2])
+def test_image_size_jpeg(marker):
+    assert image_size(jpeg(1920, 1080, marker)) == (1920, 1080)
+
+
+def test_image_size_unknown():
+    assert image_size(b"GIF89a" + b"\x00" * 32) is None
+    assert image_size(b"\xff\xd8\xff\xd9") is None
+
+
+# (viewport, device scale factor, region shown by the image)
+GEOMETRIES = [
+    ((1280, 800), 1.0, None),
+    ((1280, 800), 2.0, None),
+    ((390, 844), 3.0, None),
+    ((1440, 900), 1.5, None),
+    # Crops, e.g. the grounding region of a scrolled page, in viewport coordinates
+    ((1280, 800), 2.0, (320, 160, 400, 400)),
+    ((1920, 1080), 1.25, (0, 540, 960, 540)),
+]
+
+
+def geometry(viewport, dpr, region, scale="device") -> FrameGeometry:
+    width, height = region[2:] if region else viewport
+    factor = dpr if scale == "device" else 1
+    return FrameGeometry(
+        viewport_width=viewport[0],
+        viewport_height=viewport[1],
+        device_scale_factor=dpr,
+        image_width=round(width * factor),
+        image_height=round(height * factor),
+        region_x=region[0] if region else 0.0,
+        region_y=region[1] if region else 0.0,
+        region_width=region[2] if region else None,
+        region_height=region[3] if region else None,
+    )
+
+
+@pytest.mark.parametrize("viewport,dpr,region", GEOMETRIES)
+@pytest.mark.parametrize("scale", ["device", "css"])
+def test_image_css_round_trip(viewport, dpr, region, scale):
+    frame = geometry(viewport, dpr, region, scale)
+    for x, y in [(0, 0), (frame.image_width / 2, frame.image_height / 3), (frame.image_width, frame.image_height)]:
+        css = frame.image_to_css(x, y)
+        assert frame.css_to_image(*css) == pytest.approx((x, y))
+
+
+@pytest.mark.parametrize("viewport,dpr,region", GEOMETRIES)
+def test_normalized_to_css(viewport, dpr, region):
+    frame = geometry(viewport, dpr, region)
+    left, top = frame.region_x, frame.region_y
+    assert frame.normalized_to_css(0, 0) == pytest.approx((left, top))
+    assert frame.normalized_to_css(1000, 1000) == pytest.approx((left + frame.region_width, top + frame.region_height))
+    # A box the model finds on the image lands on the same CSS point as its pixel coordinates
+    xmin, ymin = 250, 600
+    image_point = (xmin / 1000 * frame.image_width, ymin / 1000 * frame.image_height)
+    assert frame.normalized_to_css(xmin, ymin) == pytest.approx(frame.image_to_css(*image_point))
+
+
+def test_normalized_ignores_device_scale():
+    # The old mapping assumed a 1280x800 image, a DPR 2 frame of the same viewport maps the same
+    assert geometry((1280, 800), 2.0, None).normalized_to_css(500, 500) == (640, 400)
+    assert geometry((1280, 800), 1.0, None).normalized_to_css(500, 500) == (640, 400)
+
+
+def test_dict_round_trip():
+    frame = geometry((1280, 800), 2.0, (320, 160, 400, 400))
+    assert FrameGeometry.from_dict(frame.to_dict()) == frame
+    assert FrameGeometry.from_dict(geometry((800, 600), 1.0, None).to_dict()).region_width == 800
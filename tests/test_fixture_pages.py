@@ -0,0 +1,69 @@
+"""Model coordinates on real screenshots of a fixture page, at several viewports, DPRs and scroll positions."""
+from pathlib import Path
+
+import pytest
+
+sync_api = pytest.importorskip("playwright.sync_api")
+
+from src.browser.coordinates import FrameGeometry, image_size
+
+FIXTURE = (Path(__file__).parent / "fixtures" / "targets.html").as_uri()
+
+VIEWPORTS = [
+    ({"width": 1280, "height": 800}, 1),
+    ({"width": 800, "height": 600}, 2),
+    ({"width": 390, "height": 844}, 3),
+]
+
+
+@pytest.fixture(scope="module")
+def browser():
+    with sync_api.sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        yield browser
+        browser.close()
+
+
+@pytest.mark.parametrize("viewport,dpr", VIEWPORTS)
+@pytest.mark.parametrize("target", ["top", "middle", "far"])
+def test_model_box_clicks_target(browser, viewport, dpr, target):
+    page = browser.new_page(viewport=viewport, device_scale_factor=dpr)
+    try:
+        page.goto(FIXTURE)
+        page.locator(f"#{target}").scroll_into_view_if_needed()
+        screenshot = page.screenshot()
+        assert image_size(screenshot) == (viewport["width"] * dpr, viewport["height"] * dpr)
+
+        frame = FrameGeometry(viewport["width"], viewport["height"], dpr, *image_size(screenshot))
+        box = page.locator(f"#{target}").bounding_box()
+        # The box a vision model would return on this image, normalized to 0-1000
+        ymin, xmin = box["y"] * dpr / frame.image_height * 1000, box["x"] * dpr / frame.image_width * 1000
+        ymax = (box["y"] + box["height"]) * dpr / frame.image_height * 1000
+        xmax = (box["x"] + box["width"]) * dpr / frame.image_width * 1000
+
+        left, top = frame.normalized_to_css(xmin, ymin)
+        right, bottom = frame.normalized_to_css(xmax, ymax)
+        page.mouse.click((left + right) / 2, (top + bottom) / 2)
+        assert page.evaluate("window.clicks") == [target]
+    finally:
+        page.close()
+
+
+@pytest.mark.parametrize("viewport,dpr", VIEWPORTS[:2])
+def test_clipped_region_maps_back(browser, viewport, dpr):
+    page = browser.new_page(viewport=viewport, device_scale_factor=dpr)
+    try:
+        page.goto(FIXTURE)
+        page.evaluate("window.scrollTo(0, 200)")
+        box = page.locator("#middle").bounding_box()
+        region = {"x": max(0, box["x"] - 100), "y": max(0, box["y"] - 100), "width": 300, "height": 240}
+        # CSS scale, as grounding crops are captured
+        screenshot = page.screenshot(clip=region, scale="css")
+        frame = FrameGeometry(viewport["width"], viewport["height"], dpr, *image_size(screenshot), region["x"], region["y"], region["width"], region["height"])
+        assert (frame.image_width, frame.image_height) == (300, 240)
+
+        center = frame.image_to_css((box["x"] - region["x"] + box["width"] / 2), (box["y"] - region["y"] + box["height"] / 2))
+        page.mouse.click(*center)
+        assert page.evaluate("window.clicks") == ["middle"]
+    finally:
+        page.close()